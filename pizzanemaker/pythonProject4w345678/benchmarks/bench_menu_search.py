@@ -0,0 +1,90 @@
+"""Бенчмарк поиска по меню.
+
+Сравнивает MenuSearchIndex с перебором всех позиций на синтетическом меню:
+запрос набирается посимвольно, как в поле поиска, и на каждое нажатие
+замеряется время поиска.
+
+    python benchmarks/bench_menu_search.py [--items 5000] [--budget-ms 5]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import MenuSearchIndex  # noqa: E402
+
+WORDS = ["маргарита", "пепперони", "гавайская", "сырная", "мясная", "острая",
+         "грибная", "деревенская", "морская", "овощная", "барбекю", "цезарь"]
+INGREDIENTS = ["сыр", "моцарелла", "пармезан", "томаты", "соус", "ветчина",
+               "ананасы", "грибы", "бекон", "пепперони", "лук", "перец", "оливки",
+               "креветки", "курица", "кукуруза", "базилик", "чеснок"]
+DRINKS = ["кола", "фанта", "спрайт", "вода", "сок", "морс", "лимонад", "чай"]
+QUERIES = ["пепперони", "сыр гриб", "морская кре", "кола", "овощная 17"]
+
+
+def make_menu(items, seed=0):
+    rng = random.Random(seed)
+    menu = {"Пиццы": {}, "Напитки": {}}
+    for i in range(items):
+        if i % 4 == 3:
+            menu["Напитки"][f"{rng.choice(DRINKS)} {i}"] = {"цена": 150, "объем": "1л"}
+        else:
+            menu["Пиццы"][f"{rng.choice(WORDS)} {i}"] = {
+                "цена": 500,
+                "размер": "большая",
+                "ингредиенты": ", ".join(rng.sample(INGREDIENTS, 4))
+            }
+    return menu
+
+
+def search_scan(menu, query):
+    """Перебор всех позиций с разбором названия и состава на каждый запрос"""
+    words = MenuSearchIndex.tokenize(query)
+    result = {category: [] for category in menu}
+    for category, entries in menu.items():
+        for name, info in entries.items():
+            tokens = MenuSearchIndex.tokenize(f"{name} {info.get('ингредиенты', '')}")
+            if all(any(token.startswith(word) for token in tokens) for word in words):
+                result[category].append(name)
+    return result
+
+
+def keystroke_times(search, menu_or_index):
+    """Время поиска на каждое нажатие при наборе всех запросов, мс"""
+    times = []
+    for query in QUERIES:
+        for length in range(1, len(query) + 1):
+            started = time.perf_counter()
+            search(menu_or_index, query[:length])
+            times.append((time.perf_counter() - started) * 1000)
+    return times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--budget-ms", type=float, default=5.0,
+                        help="бюджет на одно нажатие, мс")
+    args = parser.parse_args()
+
+    menu = make_menu(args.items)
+    started = time.perf_counter()
+    index = MenuSearchIndex(menu)
+    build_ms = (time.perf_counter() - started) * 1000
+    print(f"Позиций: {args.items}, префиксов в индексе: {len(index.prefixes)}, "
+          f"построение: {build_ms:.1f} мс")
+
+    for query in QUERIES:
+        assert index.search(query) == search_scan(menu, query), query
+
+    scan = keystroke_times(search_scan, menu)
+    indexed = keystroke_times(MenuSearchIndex.search, index)
+    print(f"Перебор:  медиана {statistics.median(scan):7.2f} мс, максимум {max(scan):7.2f} мс")
+    print(f"Индекс:   медиана {statistics.median(indexed):7.2f} мс, максимум {max(indexed):7.2f} мс")
+
+    if max(indexed) > args.budget_ms:
+        sys.exit(1)
@@ -0,0 +1,118 @@
+"""Бенчмарк подсчета популярных позиций.
+
+Сравнивает построчный разбор (split + Counter по каждому заказу) с
+векторизованным AnalyticsAggregates.count_items на синтетических заказах.
+
+    python benchmarks/bench_popular_items.py [--orders 1000000] [--distinct 20000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import AnalyticsAggregates, AnalyticsManager, CartLine, ORDER_DATE_FORMAT  # noqa: E402
+
+PIZZAS = ["маргарита", "пепперони", "гавайская", "четыре сыра", "мясная"]
+SIZES = [("25 см", 400), ("30 см", 550), ("35 см", 700)]
+DRINKS = ["кола", "фанта", "спрайт", "вода", "сок"]
+VOLUMES = [("0.33 л", 90), ("0.5 л", 120), ("1 л", 180)]
+TOPPINGS = ["Сыр", "Грибы", "Ветчина", "Оливки", "Перец"]
+
+
+def make_templates(count, rng):
+    """Набор различных заказов, из которых собирается синтетическая история"""
+    templates = []
+    for _ in range(count):
+        lines = []
+        for _ in range(rng.integers(1, 5)):
+            kind = rng.choice(["pizza", "drink", "custom"], p=[0.6, 0.3, 0.1])
+            if kind == "pizza":
+                size, price = SIZES[rng.integers(len(SIZES))]
+                line = CartLine("pizza", str(rng.choice(PIZZAS)), size, unit_price=price)
+            elif kind == "drink":
+                volume, price = VOLUMES[rng.integers(len(VOLUMES))]
+                line = CartLine("drink", str(rng.choice(DRINKS)), volume, unit_price=price)
+            else:
+                toppings = tuple(sorted(rng.choice(TOPPINGS, 2, replace=False).tolist()))
+                line = CartLine("custom", "custom", toppings=toppings, unit_price=650)
+            line.quantity = int(rng.integers(1, 4))
+            if rng.random() < 0.1:
+                line.comment = "без лука"
+            lines.append(line)
+
+        items = []
+        for line in lines:
+            item = line.title()
+            if line.comment:
+                item += f" (комментарий: {line.comment})"
+            items.append(item)
+        templates.append(('; '.join(items),
+                          json.dumps([line.to_record() for line in lines],
+                                     ensure_ascii=False)))
+    return templates
+
+
+def make_orders(count, distinct=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    templates = make_templates(distinct, rng)
+    picks = rng.integers(len(templates), size=count)
+    start = pd.Timestamp("2025-01-01").value // 10 ** 9
+    seconds = np.sort(rng.integers(start, start + 365 * 24 * 3600, size=count))
+    dates = pd.to_datetime(seconds, unit="s").strftime(ORDER_DATE_FORMAT)
+    return pd.DataFrame({
+        'Дата': dates,
+        'Заказ': [templates[i][0] for i in picks],
+        'Позиции': [templates[i][1] for i in picks],
+    })
+
+
+def count_items_loop(df):
+    """Прежняя реализация: построчный разбор каждого заказа"""
+    order_counts = Counter()
+    for orders, lines in zip(df['Заказ'], df['Позиции']):
+        if isinstance(lines, str) and lines:
+            for record in json.loads(lines):
+                line = CartLine.from_record(record)
+                order_counts[line.title()] += line.quantity
+        elif pd.notna(orders):
+            order_counts.update(str(orders).split('; '))
+    return order_counts
+
+
+def measure(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--distinct", type=int, default=20000,
+                        help="число различных заказов (состав и количества)")
+    args = parser.parse_args()
+
+    print(f"Генерация {args.orders} заказов...")
+    df = make_orders(args.orders, args.distinct)
+    print(f"Различных заказов: {df[['Заказ', 'Позиции']].drop_duplicates().shape[0]}")
+
+    expected, loop_time = measure(count_items_loop, df)
+    counts, vector_time = measure(AnalyticsAggregates.count_items, df)
+    assert dict(expected) == {title: int(count) for title, count in counts.items()}
+
+    print(f"Построчно:       {loop_time:8.2f} с")
+    print(f"Векторизованно:  {vector_time:8.2f} с  (x{loop_time / vector_time:.1f})")
+
+    # Топ-10 за месяц: фильтр по дате и подсчет одним проходом
+    month = (pd.Timestamp("2025-06-01"), pd.Timestamp("2025-07-01"))
+    _, month_time = measure(
+        lambda: AnalyticsAggregates.count_items(
+            AnalyticsManager.filter_by_date(df, *month)).head(10))
+    print(f"Топ-10 за июнь:  {month_time:8.2f} с")
@@ -0,0 +1,103 @@
+"""Бенчмарк запуска Pizza Maker.
+
+1. Время импорта main.py по `python -X importtime` и самые дорогие модули.
+   Тяжелые библиотеки (pandas, numpy, reportlab, matplotlib, qrcode)
+   не должны импортироваться до первого окна.
+2. Время до первого окна PizzaMakerApp (`main.py --exit-after-first-frame`,
+   нужен дисплей): от первой строки main.py, то есть вместе с импортом
+   customtkinter и остальных модулей, и от запуска процесса.
+
+    python benchmarks/bench_startup.py [--runs 5] [--budget-ms 300]
+
+Код возврата 1, если импорт main.py дольше бюджета или в нем оказались
+тяжелые модули.
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["pandas", "numpy", "matplotlib", "reportlab", "qrcode", "pyarrow"]
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_times(code):
+    """Разбор вывода -X importtime: [(модуль, cumulative мкс, вложенность)]"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=APP_DIR, capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            depth = (len(match.group(3)) - 1) // 2
+            modules.append((match.group(4), int(match.group(2)), depth))
+    return modules
+
+
+def measure_imports(runs):
+    totals = []
+    for _ in range(runs):
+        modules = import_times("import main")
+        totals.append(dict((name, cumulative) for name, cumulative, _ in modules)["main"])
+    top_level = [(name, cumulative) for name, cumulative, depth in modules
+                 if depth == 1 and name != "main"]
+    loaded_heavy = sorted({name.split(".")[0] for name, _, _ in modules} &
+                          set(HEAVY_MODULES))
+    return statistics.median(totals) / 1000, top_level, loaded_heavy
+
+
+def measure_heavy_imports():
+    """Сколько стоили бы тяжелые модули, если импортировать их сразу"""
+    code = "; ".join(f"import {name}" for name in
+                     ["pandas", "numpy", "qrcode", "reportlab.pdfgen.canvas",
+                      "matplotlib.figure"])
+    modules = import_times(code)
+    return sum(cumulative for _, cumulative, depth in modules if depth == 0) / 1000
+
+
+def measure_first_frame(runs):
+    wall_times, first_frames = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, "main.py", "--exit-after-first-frame"],
+                                cwd=APP_DIR, capture_output=True, text=True, timeout=120)
+        wall_time = (time.perf_counter() - started) * 1000
+        match = re.search(r"first_frame_ms=([\d.]+)", result.stdout)
+        if result.returncode != 0 or not match:
+            error = (result.stderr.strip().splitlines() or ["нет вывода"])[-1]
+            return None, error
+        wall_times.append(wall_time)
+        first_frames.append(float(match.group(1)))
+    return (statistics.median(first_frames), statistics.median(wall_times)), None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=300.0,
+                        help="бюджет времени импорта main.py, мс")
+    args = parser.parse_args()
+
+    import_ms, top_level, loaded_heavy = measure_imports(args.runs)
+    print(f"Импорт main.py: {import_ms:.1f} мс (медиана из {args.runs}, бюджет {args.budget_ms:.0f} мс)")
+    for name, cumulative in sorted(top_level, key=lambda item: -item[1])[:10]:
+        print(f"  {cumulative / 1000:8.1f} мс  {name}")
+    print(f"Тяжелые модули при импорте: {', '.join(loaded_heavy) or 'нет'}")
+    print(f"Отложено (импорт тяжелых модулей сразу): {measure_heavy_imports():.1f} мс")
+
+    timings, error = measure_first_frame(args.runs)
+    if timings is None:
+        print(f"Время до первого окна: не измерено ({error})")
+    else:
+        first_frame_ms, wall_ms = timings
+        print(f"Время до первого окна: {first_frame_ms:.1f} мс от начала main.py, "
+              f"{wall_ms:.1f} мс с запуска процесса")
+
+    if import_ms > args.budget_ms or loaded_heavy:
+        sys.exit(1)
@@ -1,55 +1,1432 @@
+import time
+_STARTED = time.perf_counter()
+
 import customtkinter as ctk
-import pandas as pd
-import qrcode
+import io
 import os
+import re
+import copy
+import json
+import html
+import hashlib
+import queue
+import argparse
+import importlib
+import importlib.util
+import threading
+import sqlite3
 import configparser
 from datetime import datetime
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from PIL import Image, ImageTk
 import tkinter.messagebox as messagebox
 from tkinter import simpledialog, scrolledtext
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import inch
-import matplotlib.pyplot as plt
-from collections import Counter
-import numpy as np
+from collections import Counter, OrderedDict
+from types import MappingProxyType
+
+
+class LazyModule:
+    """Модуль, который импортируется при первом обращении к его атрибуту.
+
+    Тяжелые библиотеки (pandas, numpy, reportlab, matplotlib, qrcode) не
+    задерживают появление первого окна: после него они подгружаются в
+    фоновом потоке (PizzaMakerApp.prewarm_imports), а если понадобились
+    раньше - при первом использовании.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _import(self):
+        # Не "load": имя метода прокси закрыло бы атрибут модуля (np.load)
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._import(), attr)
+
+
+pd = LazyModule("pandas")
+np = LazyModule("numpy")
+qrcode = LazyModule("qrcode")
+canvas = LazyModule("reportlab.pdfgen.canvas")
+matplotlib_figure = LazyModule("matplotlib.figure")
+pa = LazyModule("pyarrow")
+feather = LazyModule("pyarrow.feather")
+# Без pyarrow архив заказов сохраняется в .npz
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+# Импортируются в фоне после отрисовки первого окна
+PREWARM_MODULES = [pd, np, qrcode, canvas, matplotlib_figure]
+
+LETTER = (612.0, 792.0)  # reportlab.lib.pagesizes.letter, пункты
 
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("blue")
 
 
+# 'Позиции' - строки корзины в JSON (см. CartLine.to_record)
+ORDER_COLUMNS = [
+    'ID', 'Дата', 'ФИО', 'Возраст', 'Заказ', 'Комментарий', 'Сумма', 'Оплата',
+    'Сдача', 'Позиции'
+]
+
+ORDER_DATE_FORMAT = '%d.%m.%Y %H:%M:%S'
+
+# Основное хранилище заказов и остатков: "sqlite" или "journal"
+STORAGE_BACKEND = "sqlite"
+
+# Сохранять ли QR-коды чеков отдельными PNG в qrcodes/ (в PDF они рисуются
+# напрямую)
+SAVE_QR_FILES = False
+
+# Как часто (мс) заказы и остатки выгружаются в Excel
+ORDERS_EXPORT_INTERVAL_MS = 5 * 60 * 1000
+
+
+class OrderJournal:
+    """Журнал заказов только на дозапись: одна JSON-запись на строку.
+
+    Запись заказа не зависит от размера истории. fsync выполняется пачками:
+    после fsync_every записей или если с прошлого fsync прошло больше
+    fsync_interval секунд.
+    """
+
+    def __init__(self, path, fsync_every=10, fsync_interval=2.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def append(self, record):
+        """Дозапись одного заказа в конец журнала"""
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line + '\n')
+            self._file.flush()
+            self._pending += 1
+            if (self._pending >= self.fsync_every or
+                    time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
+
+    def append_many(self, records):
+        """Дозапись нескольких заказов с одним fsync"""
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            for record in records:
+                self._file.write(
+                    json.dumps(record, ensure_ascii=False, default=str) + '\n')
+            self._file.flush()
+            self._pending += len(records)
+            self._sync()
+
+    def _sync(self):
+        if self._file is not None and self._pending:
+            os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        """Принудительный сброс накопленных записей на диск"""
+        with self._lock:
+            self._sync()
+
+    def read_all(self):
+        """Чтение всех записей журнала"""
+        records = []
+        if not self.exists():
+            return records
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Недописанная строка после аварийного завершения
+                    print(f"Пропущена поврежденная запись журнала (строка {line_no})")
+        return records
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+
+@dataclass(slots=True)
+class CartLine:
+    """Строка корзины"""
+
+    kind: str  # "pizza", "drink" или "custom"
+    product: str  # ключ позиции в меню
+    variant: str = ""  # размер пиццы или объем напитка
+    toppings: tuple = ()
+    unit_price: int = 0
+    quantity: int = 1
+    comment: str = ""
+    discount: float = 0.0  # скидка за объем напитка, %
+
+    @property
+    def total(self):
+        return self.unit_price * self.quantity
+
+    def title(self):
+        """Название позиции для корзины и чека"""
+        if self.kind == "custom":
+            return f"Кастомная пицца с: {', '.join(self.toppings)}"
+        title = f"{self.product} ({self.variant})" if self.variant else self.product
+        if self.discount > 0:
+            title += f" [СКИДКА {self.discount}%]"
+        return title
+
+    def display_name(self):
+        return f"{self.title()} 💬" if self.comment else self.title()
+
+    def to_record(self):
+        return {
+            "kind": self.kind,
+            "product": self.product,
+            "variant": self.variant,
+            "toppings": list(self.toppings),
+            "unit_price": self.unit_price,
+            "quantity": self.quantity,
+            "comment": self.comment,
+            "discount": self.discount
+        }
+
+    @classmethod
+    def from_record(cls, record):
+        record = dict(record)
+        record["toppings"] = tuple(record.get("toppings", ()))
+        return cls(**record)
+
+
+class Cart:
+    """Корзина с индексом строк по ключу (товар, вариант) и текущей суммой.
+
+    Одинаковые позиции объединяются увеличением количества; добавление,
+    изменение и удаление строки, а также пересчет суммы и НДС - O(1).
+    """
+
+    VAT_RATE = 20  # НДС, %, входит в цену
+
+    def __init__(self):
+        self.lines = {}  # ключ -> CartLine, в порядке добавления
+        self.total = 0
+        self.vat = 0
+
+    @staticmethod
+    def key(line):
+        # Начинки без учета порядка выбора: "Сыр, Лук" и "Лук, Сыр" - одна позиция
+        return (line.kind, line.product, line.variant, tuple(sorted(line.toppings)))
+
+    @classmethod
+    def line_vat(cls, line):
+        return int(line.total * cls.VAT_RATE / (100 + cls.VAT_RATE))
+
+    def __iter__(self):
+        return iter(self.lines.values())
+
+    def __len__(self):
+        return len(self.lines)
+
+    def _account(self, line, sign):
+        self.total += sign * line.total
+        self.vat += sign * self.line_vat(line)
+
+    def add(self, line):
+        """Добавление позиции; возвращает строку корзины и признак новой строки"""
+        key = self.key(line)
+        existing = self.lines.get(key)
+        if existing is None:
+            self.lines[key] = line
+            self._account(line, 1)
+            return line, True
+
+        self._account(existing, -1)
+        existing.quantity += line.quantity
+        existing.unit_price = line.unit_price
+        if line.comment:
+            existing.comment = line.comment
+        self._account(existing, 1)
+        return existing, False
+
+    def update(self, key, quantity=None, comment=None):
+        """Изменение количества или комментария строки"""
+        line = self.lines[key]
+        self._account(line, -1)
+        if quantity is not None:
+            line.quantity = quantity
+        if comment is not None:
+            line.comment = comment
+        self._account(line, 1)
+        return line
+
+    def remove(self, key):
+        line = self.lines.pop(key)
+        self._account(line, -1)
+        return line
+
+    def reprice(self, price_of):
+        """Пересчет цен строк после смены конфигурации.
+
+        price_of(line) возвращает (цена, скидка) или None, если цену
+        строки нужно оставить прежней.
+        """
+        for line in self.lines.values():
+            entry = price_of(line)
+            if entry is None or entry == (line.unit_price, line.discount):
+                continue
+            self._account(line, -1)
+            line.unit_price, line.discount = entry
+            self._account(line, 1)
+
+    def find(self, product):
+        """Последняя добавленная строка с указанным товаром"""
+        for line in reversed(self.lines.values()):
+            if line.product == product:
+                return line
+        return None
+
+    def clear(self):
+        self.lines.clear()
+        self.total = 0
+        self.vat = 0
+
+
+@dataclass(frozen=True)
+class OrderSnapshot:
+    """Снимок оформленного заказа для обработки в фоне и печати чека"""
+
+    receipt_id: str
+    created: datetime
+    fio: str
+    age: int
+    lines: tuple
+    total: int
+    vat: int
+    comment: str
+    payment_method: str
+    change: int
+
+    @classmethod
+    def from_cart(cls, cart, user_data, comment, payment_method, change):
+        created = datetime.now()
+        return cls(receipt_id=created.strftime("%Y%m%d%H%M%S"),
+                   created=created,
+                   fio=user_data["fio"],
+                   age=user_data["age"],
+                   lines=tuple(copy.copy(line) for line in cart),
+                   total=cart.total,
+                   vat=cart.vat,
+                   comment=comment,
+                   payment_method=payment_method,
+                   change=change)
+
+    @classmethod
+    def from_record(cls, record):
+        """Снимок заказа из записи хранилища (для повторной печати чека)"""
+        receipt_id = str(record['ID'])
+        try:
+            created = datetime.strptime(str(record['Дата']), ORDER_DATE_FORMAT)
+        except (TypeError, ValueError):
+            created = datetime.strptime(receipt_id[:14], "%Y%m%d%H%M%S")
+
+        if record.get('Позиции'):
+            lines = tuple(CartLine.from_record(line)
+                          for line in json.loads(record['Позиции']))
+        else:
+            # Заказы, сохраненные до появления структурированных позиций:
+            # цены строк неизвестны, печатаются только названия и итог
+            lines = []
+            for item in str(record.get('Заказ') or '').split('; '):
+                title, _, comment = item.partition(" (комментарий: ")
+                if title:
+                    lines.append(CartLine("legacy", title,
+                                          comment=comment[:-1] if comment else ""))
+            lines = tuple(lines)
+
+        total = int(record.get('Сумма') or 0)
+        return cls(receipt_id=receipt_id,
+                   created=created,
+                   fio=record.get('ФИО') or "",
+                   age=record.get('Возраст') or 0,
+                   lines=lines,
+                   total=total,
+                   vat=int(total * Cart.VAT_RATE / (100 + Cart.VAT_RATE)),
+                   comment=record.get('Комментарий') or "",
+                   payment_method=record.get('Оплата') or "",
+                   change=int(record.get('Сдача') or 0))
+
+    @property
+    def date_text(self):
+        return self.created.strftime(ORDER_DATE_FORMAT)
+
+    def to_record(self):
+        """Запись заказа для хранилища"""
+        order_items = []
+        # Собираем информацию о заказе с комментариями
+        for line in self.lines:
+            item_info = line.title()
+            if line.comment:
+                item_info += f" (комментарий: {line.comment})"
+            order_items.append(item_info)
+
+        return {
+            'ID': self.receipt_id,
+            'Дата': self.date_text,
+            'ФИО': self.fio,
+            'Возраст': self.age,
+            'Заказ': '; '.join(order_items),
+            'Комментарий': self.comment,
+            'Сумма': self.total,
+            'Оплата': self.payment_method,
+            'Сдача': self.change,
+            'Позиции': json.dumps([line.to_record() for line in self.lines],
+                                  ensure_ascii=False)
+        }
+
+
+class StorageBackend:
+    """Базовый интерфейс хранилища заказов и остатков"""
+
+    def add_order(self, order_data):
+        raise NotImplementedError
+
+    def load_orders(self):
+        raise NotImplementedError
+
+    def load_orders_since(self, start):
+        """Заказы, оформленные не раньше start (datetime)"""
+        df = self.load_orders()
+        return df[AnalyticsAggregates.parse_dates(df['Дата']) >= start]
+
+    def load_inventory(self):
+        """Остатки в виде DataFrame или None, если их еще нет"""
+        raise NotImplementedError
+
+    def load_inventory_records(self):
+        """Остатки списком словарей или None, если их еще нет"""
+        df = self.load_inventory()
+        return None if df is None else df.to_dict('records')
+
+    def save_inventory(self, df):
+        raise NotImplementedError
+
+    def decrement_inventory(self, deductions):
+        """Списание продуктов: deductions - список пар (продукт, количество)"""
+        raise NotImplementedError
+
+    def get_low_stock(self):
+        """Продукты, запас которых не выше минимального"""
+        raise NotImplementedError
+
+    def count_orders(self):
+        return len(self.load_orders())
+
+    def order_files(self):
+        """Файлы, в которых хранятся заказы (для проверки изменений)"""
+        return []
+
+    def get_sales_summary(self):
+        """Количество заказов, выручка и средний чек"""
+        df = self.load_orders()
+        if df.empty:
+            return 0, 0, 0
+        return len(df), df['Сумма'].sum(), df['Сумма'].mean()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class JournalStorage(StorageBackend):
+    """Хранилище на журнале заказов и Excel-файле остатков"""
+
+    def __init__(self, data_dir, inventory_file):
+        self.journal = OrderJournal(
+            os.path.join(data_dir, "orders_journal.jsonl"))
+        self.inventory_file = inventory_file
+        self._inventory_lock = threading.Lock()
+
+    def import_orders(self, records):
+        self.journal.append_many(records)
+
+    def order_files(self):
+        return [self.journal.path]
+
+    def add_order(self, order_data):
+        self.journal.append(order_data)
+
+    def load_orders(self):
+        return pd.DataFrame(self.journal.read_all(), columns=ORDER_COLUMNS)
+
+    def load_inventory(self):
+        if os.path.exists(self.inventory_file):
+            return pd.read_excel(self.inventory_file)
+        return None
+
+    def save_inventory(self, df):
+        df.to_excel(self.inventory_file, index=False)
+
+    def decrement_inventory(self, deductions):
+        with self._inventory_lock:
+            df = self.load_inventory()
+            for product_name, amount in deductions:
+                mask = df['Продукт'] == product_name
+                if mask.any():
+                    current_value = df.loc[mask, 'Количество'].iloc[0]
+                    if current_value >= amount:
+                        df.loc[mask, 'Количество'] = current_value - amount
+            self.save_inventory(df)
+
+    def get_low_stock(self):
+        df = self.load_inventory()
+        if df is None:
+            return []
+        return df[df['Количество'] <= df['Минимальный_запас']]['Продукт'].tolist()
+
+    def flush(self):
+        self.journal.sync()
+
+    def close(self):
+        self.journal.close()
+
+
+class SQLiteStorage(StorageBackend):
+    """Встроенное хранилище SQLite (WAL) с индексами по ID и дате заказа"""
+
+    # Колонка DataFrame -> колонка таблицы orders
+    ORDER_FIELDS = [('ID', 'order_id'), ('Дата', 'date_text'), ('ФИО', 'fio'),
+                    ('Возраст', 'age'), ('Заказ', 'items'),
+                    ('Комментарий', 'comment'), ('Сумма', 'total'),
+                    ('Оплата', 'payment'), ('Сдача', 'change'),
+                    ('Позиции', 'lines')]
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.is_new = not os.path.exists(db_file)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS orders (
+                    rowid INTEGER PRIMARY KEY,
+                    order_id TEXT NOT NULL,
+                    created_at TEXT,
+                    date_text TEXT,
+                    fio TEXT,
+                    age INTEGER,
+                    items TEXT,
+                    comment TEXT,
+                    total REAL,
+                    payment TEXT,
+                    change REAL,
+                    lines TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_orders_order_id ON orders(order_id);
+                CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at);
+                CREATE TABLE IF NOT EXISTS inventory (
+                    product TEXT PRIMARY KEY,
+                    quantity REAL NOT NULL,
+                    unit TEXT,
+                    min_stock REAL NOT NULL DEFAULT 0,
+                    position INTEGER NOT NULL DEFAULT 0
+                );
+            """)
+            columns = [row[1] for row in
+                       self._conn.execute("PRAGMA table_info(orders)")]
+            if 'lines' not in columns:
+                self._conn.execute("ALTER TABLE orders ADD COLUMN lines TEXT")
+
+    def _order_row(self, order_data):
+        created_at = None
+        try:
+            created_at = datetime.strptime(
+                str(order_data.get('Дата')),
+                ORDER_DATE_FORMAT).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            pass
+        row = [str(order_data.get('ID')), created_at]
+        for column, _ in self.ORDER_FIELDS[1:]:
+            value = order_data.get(column)
+            if isinstance(value, float) and value != value:  # NaN
+                value = None
+            row.append(value)
+        return row
+
+    def import_orders(self, records):
+        columns = ', '.join(['order_id', 'created_at'] +
+                            [field for _, field in self.ORDER_FIELDS[1:]])
+        placeholders = ', '.join('?' * (len(self.ORDER_FIELDS) + 1))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO orders ({columns}) VALUES ({placeholders})",
+                [self._order_row(record) for record in records])
+
+    def add_order(self, order_data):
+        self.import_orders([order_data])
+
+    def load_orders(self):
+        select = ', '.join(f'{field} AS "{column}"'
+                           for column, field in self.ORDER_FIELDS)
+        with self._lock:
+            return pd.read_sql_query(
+                f"SELECT {select} FROM orders ORDER BY rowid", self._conn)
+
+    def load_orders_since(self, start):
+        select = ', '.join(f'{field} AS "{column}"'
+                           for column, field in self.ORDER_FIELDS)
+        with self._lock:
+            return pd.read_sql_query(
+                f"SELECT {select} FROM orders WHERE created_at >= ? ORDER BY rowid",
+                self._conn, params=(start.strftime('%Y-%m-%d %H:%M:%S'),))
+
+    def count_orders(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+    def order_files(self):
+        return [self.db_file, self.db_file + '-wal']
+
+    def load_inventory(self):
+        with self._lock:
+            df = pd.read_sql_query(
+                'SELECT product AS "Продукт", quantity AS "Количество", '
+                'unit AS "Единица_измерения", min_stock AS "Минимальный_запас" '
+                'FROM inventory ORDER BY position', self._conn)
+        return df if not df.empty else None
+
+    def load_inventory_records(self):
+        # Без pandas: остатки нужны при запуске, до первого окна
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT product, quantity, unit, min_stock FROM inventory "
+                "ORDER BY position").fetchall()
+        if not rows:
+            return None
+        return [{'Продукт': product, 'Количество': quantity,
+                 'Единица_измерения': unit, 'Минимальный_запас': min_stock}
+                for product, quantity, unit, min_stock in rows]
+
+    def save_inventory(self, df):
+        rows = [(row['Продукт'], float(row['Количество']),
+                 row.get('Единица_измерения'),
+                 float(row.get('Минимальный_запас', 0) or 0), position)
+                for position, row in enumerate(df.to_dict('records'))]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM inventory")
+            self._conn.executemany(
+                "INSERT INTO inventory (product, quantity, unit, min_stock, position) "
+                "VALUES (?, ?, ?, ?, ?)", rows)
+
+    def decrement_inventory(self, deductions):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE inventory SET quantity = quantity - ? "
+                "WHERE product = ? AND quantity >= ?",
+                [(amount, product, amount) for product, amount in deductions])
+
+    def get_low_stock(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT product FROM inventory WHERE quantity <= min_stock "
+                "ORDER BY position").fetchall()
+        return [row[0] for row in rows]
+
+    def get_sales_summary(self):
+        with self._lock:
+            count, revenue, avg = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(total), 0), COALESCE(AVG(total), 0) "
+                "FROM orders").fetchone()
+        return count, revenue, avg
+
+    def flush(self):
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class InventoryCache:
+    """Остатки в памяти с пакетной фоновой записью в хранилище.
+
+    Списание меняет словарь за O(1) и сразу дописывает новые значения
+    остатков в журнал inventory.wal. Фоновый поток раз в flush_interval
+    секунд сохраняет все накопленные изменения одной записью. Журнал хранит
+    абсолютные значения, поэтому его повторное применение после сбоя
+    безопасно в любой момент.
+    """
+
+    def __init__(self, storage, wal_file, flush_interval=5.0):
+        self.storage = storage
+        self.wal_file = wal_file
+        self.flush_interval = flush_interval
+        self.items = {}  # продукт -> [количество, единица, минимальный запас]
+        self.low_stock = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wal = None
+        self._dirty = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load(self, records, recover=True):
+        """Загрузка остатков (список словарей) и восстановление неучтенных
+        списаний.
+
+        При recover=False records считаются актуальными, и журнал очищается.
+        """
+        with self._lock:
+            self.items = {}
+            for row in records:
+                self.items[row['Продукт']] = [
+                    float(row['Количество']), row.get('Единица_измерения'),
+                    float(row.get('Минимальный_запас', 0) or 0)
+                ]
+            if recover:
+                recovered = (self._replay(self.wal_file + '.old') +
+                             self._replay(self.wal_file))
+            else:
+                recovered = 0
+                if self._wal is not None:
+                    self._wal.close()
+                    self._wal = None
+                for path in (self.wal_file, self.wal_file + '.old'):
+                    if os.path.exists(path):
+                        os.remove(path)
+            self.low_stock = {product for product, item in self.items.items()
+                              if item[0] <= item[2]}
+            self._dirty = recovered > 0
+        if recovered:
+            print(f"Восстановлено списаний из журнала остатков: {recovered}")
+            self.flush()
+
+    def _replay(self, path):
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    values = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                for product, quantity in values.items():
+                    if product in self.items:
+                        self.items[product][0] = quantity
+                count += 1
+        return count
+
+    def start(self):
+        """Запуск фоновой записи"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+            self._thread.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def decrement(self, deductions):
+        """Списание продуктов: deductions - список пар (продукт, количество)"""
+        with self._lock:
+            changed = {}
+            for product_name, amount in deductions:
+                item = self.items.get(product_name)
+                if item is not None and item[0] >= amount:
+                    item[0] -= amount
+                    changed[product_name] = item[0]
+                    if item[0] <= item[2]:
+                        self.low_stock.add(product_name)
+            if changed:
+                if self._wal is None:
+                    self._wal = open(self.wal_file, 'a', encoding='utf-8')
+                self._wal.write(json.dumps(changed, ensure_ascii=False) + '\n')
+                self._wal.flush()
+                os.fsync(self._wal.fileno())
+                self._dirty = True
+            return sorted(self.low_stock)
+
+    def to_dataframe(self):
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self):
+        return pd.DataFrame(
+            [[product, *item] for product, item in self.items.items()],
+            columns=['Продукт', 'Количество', 'Единица_измерения',
+                     'Минимальный_запас'])
+
+    def flush(self):
+        """Запись всех накопленных списаний одним сохранением"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return True
+                df = self._snapshot()
+                # Новые списания пойдут в свежий журнал, пока идет запись
+                if self._wal is not None:
+                    self._wal.close()
+                    self._wal = None
+                if os.path.exists(self.wal_file):
+                    self._rotate_wal()
+                self._dirty = False
+            try:
+                self.storage.save_inventory(df)
+            except Exception as e:
+                print(f"Ошибка записи остатков: {e}")
+                with self._lock:
+                    self._dirty = True
+                return False
+            if os.path.exists(self.wal_file + '.old'):
+                os.remove(self.wal_file + '.old')
+            return True
+
+    def _rotate_wal(self):
+        """Перенос журнала в .old. Если .old остался от неудачной записи,
+        журнал дописывается в его конец: .old удаляется только после
+        успешного сохранения, и более поздние значения идут последними."""
+        old_file = self.wal_file + '.old'
+        if not os.path.exists(old_file):
+            os.replace(self.wal_file, old_file)
+            return
+        with open(self.wal_file, 'r', encoding='utf-8') as src, \
+                open(old_file, 'a', encoding='utf-8') as dst:
+            dst.write(src.read())
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.remove(self.wal_file)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        with self._lock:
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+
+
+class AnalyticsAggregates:
+    """Агрегаты аналитики, обновляемые при каждом сохранении заказа.
+
+    Хранятся в data/analytics.json: счетчики позиций, гистограмма
+    возрастов, сумма и количество заказов, корзины по часам и дням недели.
+    Запросы аналитики не зависят от размера истории заказов. Если число
+    учтенных заказов расходится с хранилищем, агрегаты пересчитываются.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.orders = 0
+        self.revenue = 0
+        self.items = Counter()
+        self.ages = Counter()
+        self.hours = [[0, 0] for _ in range(24)]  # [заказы, выручка]
+        self.weekdays = [[0, 0] for _ in range(7)]
+
+    @staticmethod
+    def order_items(record):
+        """Пары (название позиции, количество) из записи заказа"""
+        lines = record.get('Позиции')
+        if isinstance(lines, str) and lines:
+            for line_record in json.loads(lines):
+                line = CartLine.from_record(line_record)
+                yield line.title(), line.quantity
+        elif pd.notna(record.get('Заказ')):
+            # Заказы, сохраненные до появления структурированных позиций
+            for item in str(record['Заказ']).split('; '):
+                yield item.partition(" (комментарий: ")[0], 1
+
+    @staticmethod
+    def parse_dates(dates):
+        """Разбор колонки 'Дата' (формат ORDER_DATE_FORMAT) в datetime64.
+
+        Различных дней и времен суток в истории немного, поэтому каждая
+        часть разбирается один раз для уникальных значений.
+        """
+        dates = dates.fillna('').astype(str)
+        day_codes, days = pd.factorize(dates.str.slice(0, 10))
+        minute_codes, minutes = pd.factorize(dates.str.slice(11, 16))
+        second_codes, seconds = pd.factorize(dates.str.slice(16))
+        days = pd.to_datetime(pd.Series(days), format='%d.%m.%Y', errors='coerce')
+        minutes = pd.to_timedelta(pd.Series(minutes) + ':00', errors='coerce')
+        seconds = pd.to_timedelta(
+            pd.to_numeric(pd.Series(seconds).str.slice(1), errors='coerce'), unit='s')
+        parsed = (days.to_numpy()[day_codes] + minutes.to_numpy()[minute_codes] +
+                  seconds.to_numpy()[second_codes])
+        return pd.Series(parsed, index=dates.index)
+
+    @classmethod
+    def count_items(cls, df):
+        """Количество каждой позиции по заказам df (Series по убыванию).
+
+        Одинаковые заказы сначала схлопываются через pd.factorize, и разбор
+        выполняется только для различных. Названия берутся из колонки
+        'Заказ' (str.split + explode), количества - из JSON 'Позиции'
+        регулярным выражением, итог считается по кодам категорий через
+        np.bincount. Построчно разбираются только заказы, где названия и
+        позиции не удалось сопоставить (например, "; " внутри комментария).
+        """
+        if df.empty:
+            return pd.Series(dtype='int64')
+
+        order_codes, order_values = pd.factorize(df['Заказ'].fillna(''))
+        line_codes, line_values = pd.factorize(df['Позиции'].fillna(''))
+        codes, pairs = pd.factorize(order_codes.astype(np.int64) * len(line_values) +
+                                    line_codes)
+        frequency = np.bincount(codes)
+        orders = pd.Series(order_values[pairs // len(line_values)], dtype=object)
+        lines = pd.Series(line_values[pairs % len(line_values)], dtype=object)
+
+        split = orders.str.split('; ')
+        found = lines.str.findall(r'(?<!\\)"quantity": (\d+)')
+        has_lines = (lines != '').to_numpy()
+        aligned = has_lines & (split.str.len() == found.str.len()).to_numpy()
+
+        items = split.explode()
+        items = items.str.replace(r' \(комментарий: .*\)$', '', regex=True)
+        item_rows = items.index.to_numpy()
+        weights = frequency[item_rows].astype(np.int64)
+        item_aligned = aligned[item_rows]
+        quantities = found[aligned].explode().astype('int64').to_numpy()
+        weights[item_aligned] *= quantities
+        # Несопоставленные заказы с позициями разбираются построчно
+        keep = (~has_lines[item_rows] | item_aligned) & (items != '').to_numpy()
+
+        categories = pd.Categorical(items[keep].to_numpy())
+        counts = np.bincount(categories.codes, weights=weights[keep],
+                             minlength=len(categories.categories))
+        result = pd.Series(counts.astype('int64'),
+                           index=categories.categories.astype(str))
+
+        extra = Counter()
+        for row in np.flatnonzero(has_lines & ~aligned):
+            record = {'Заказ': orders[row], 'Позиции': lines[row]}
+            for title, quantity in cls.order_items(record):
+                extra[title] += quantity * int(frequency[row])
+        if extra:
+            result = result.add(pd.Series(extra, dtype='int64'),
+                                fill_value=0).astype('int64')
+
+        return result.sort_values(ascending=False, kind='stable')
+
+    def _add(self, record):
+        total = record.get('Сумма')
+        total = int(total) if pd.notna(total) else 0
+        self.orders += 1
+        self.revenue += total
+        for title, quantity in self.order_items(record):
+            self.items[title] += quantity
+        if pd.notna(record.get('Возраст')):
+            self.ages[int(record['Возраст'])] += 1
+        try:
+            created = datetime.strptime(str(record['Дата']), ORDER_DATE_FORMAT)
+        except (KeyError, TypeError, ValueError):
+            return
+        for bucket in (self.hours[created.hour], self.weekdays[created.weekday()]):
+            bucket[0] += 1
+            bucket[1] += total
+
+    # Чтение из других потоков (отчет, окно аналитики): add() меняет
+    # счетчики под блокировкой в потоках обработки чеков, поэтому
+    # читатели получают копии, снятые под той же блокировкой.
+
+    def totals(self):
+        """(число заказов, выручка)"""
+        with self._lock:
+            return self.orders, self.revenue
+
+    def most_common(self, top_n):
+        with self._lock:
+            return self.items.most_common(top_n)
+
+    def age_counts(self):
+        with self._lock:
+            return dict(self.ages)
+
+    def hour_buckets(self):
+        with self._lock:
+            return [list(bucket) for bucket in self.hours]
+
+    def weekday_buckets(self):
+        with self._lock:
+            return [list(bucket) for bucket in self.weekdays]
+
+    def add(self, record):
+        """Учет нового заказа"""
+        with self._lock:
+            self._add(record)
+            self._save()
+
+    def rebuild(self, df):
+        """Полный пересчет по всем заказам"""
+        totals = pd.to_numeric(df['Сумма'], errors='coerce').fillna(0).astype('int64')
+        ages = pd.to_numeric(df['Возраст'], errors='coerce').dropna().astype('int64')
+        dates = self.parse_dates(df['Дата'])
+        dated = dates.notna()
+
+        def buckets(keys, size):
+            grouped = totals[dated].groupby(keys).agg(['count', 'sum'])
+            grouped = grouped.reindex(range(size), fill_value=0)
+            return [[int(count), int(total)] for count, total in grouped.to_numpy()]
+
+        with self._lock:
+            self.reset()
+            self.orders = len(df)
+            self.revenue = int(totals.sum())
+            self.items = Counter({title: int(count) for title, count
+                                  in self.count_items(df).items()})
+            self.ages = Counter({int(age): int(count)
+                                 for age, count in ages.value_counts().items()})
+            self.hours = buckets(dates[dated].dt.hour, 24)
+            self.weekdays = buckets(dates[dated].dt.weekday, 7)
+            self._save()
+
+    def load(self, orders_count, load_orders):
+        """Загрузка агрегатов; пересчет, если они отстали от хранилища"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            with self._lock:
+                self.orders = data['orders']
+                self.revenue = data['revenue']
+                self.items = Counter(data['items'])
+                self.ages = Counter({int(age): count
+                                     for age, count in data['ages'].items()})
+                self.hours = data['hours']
+                self.weekdays = data['weekdays']
+        except FileNotFoundError:
+            self.reset()
+        except Exception as e:
+            print(f"Ошибка загрузки агрегатов аналитики: {e}")
+            self.reset()
+        if self.orders != orders_count:
+            print("Пересчет агрегатов аналитики...")
+            self.rebuild(load_orders())
+
+    def _save(self):
+        data = {
+            'orders': self.orders,
+            'revenue': self.revenue,
+            'items': self.items,
+            'ages': self.ages,
+            'hours': self.hours,
+            'weekdays': self.weekdays
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+class DailySalesCache:
+    """Заказы и выручка по часам для каждого дня (data/daily_sales.json).
+
+    Закрытые дни (до сегодняшнего) считаются один раз и больше не
+    пересчитываются; из хранилища читаются только заказы с первого
+    незакрытого дня. Статистика по часам, дням недели и тепловая карта за
+    любой период складываются из дневных корзин.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.days = {}  # 'ГГГГ-ММ-ДД' -> 24 x [заказы, выручка]
+        self.complete_until = None  # все дни раньше этой даты уже посчитаны
+        self.open_days = {}  # текущий день, пересчитывается при каждом обновлении
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.days = data['days']
+            self.complete_until = data['complete_until']
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Ошибка загрузки дневной статистики: {e}")
+        self._loaded = True
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'complete_until': self.complete_until, 'days': self.days}, f)
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        """Сброс: все дни будут посчитаны заново при следующем обновлении"""
+        with self._lock:
+            self.days = {}
+            self.complete_until = None
+            self.open_days = {}
+            self._loaded = True
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    @staticmethod
+    def day_buckets(df):
+        """Корзины по часам для каждого дня из заказов df"""
+        dates = AnalyticsAggregates.parse_dates(df['Дата'])
+        dated = dates.notna()
+        totals = pd.to_numeric(df['Сумма'], errors='coerce').fillna(0)[dated]
+        dates = dates[dated]
+        grouped = totals.groupby([dates.dt.normalize(), dates.dt.hour]).agg(['count', 'sum'])
+
+        buckets = {}
+        for (day, hour), (count, total) in zip(grouped.index, grouped.to_numpy()):
+            key = day.strftime('%Y-%m-%d')
+            if key not in buckets:
+                buckets[key] = [[0, 0] for _ in range(24)]
+            buckets[key][hour] = [int(count), int(total)]
+        return buckets
+
+    def update(self, load_orders_since):
+        """Досчитать дни, закрытые с прошлого обновления, и текущий день"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            today = datetime.now().strftime('%Y-%m-%d')
+            start = (datetime.strptime(self.complete_until, '%Y-%m-%d')
+                     if self.complete_until else datetime.min)
+            buckets = self.day_buckets(load_orders_since(start))
+            self.open_days = {day: hours for day, hours in buckets.items()
+                              if day >= today}
+            closed = {day: hours for day, hours in buckets.items() if day < today}
+            if closed or self.complete_until != today:
+                self.days.update(closed)
+                self.complete_until = today
+                self._save()
+
+    def table(self, start=None, end=None):
+        """Массив 7 x 24 x [заказы, выручка] по дням недели и часам
+        за период с start (включительно) по end (не включая)"""
+        start = start.strftime('%Y-%m-%d') if start else ''
+        end = end.strftime('%Y-%m-%d') if end else '9999'
+        result = np.zeros((7, 24, 2), dtype=np.int64)
+        with self._lock:
+            for days in (self.days, self.open_days):
+                for day, hours in days.items():
+                    if start <= day < end:
+                        weekday = datetime.strptime(day, '%Y-%m-%d').weekday()
+                        result[weekday] += np.asarray(hours, dtype=np.int64)
+        return result
+
+
+class OrderArchive:
+    """Архив заказов по дням в колоночных файлах (data/archive).
+
+    Каждый закрытый день записывается один раз в отдельный неизменяемый
+    файл: Feather (pyarrow) или NumPy .npz, если pyarrow не установлен.
+    Чтение за период открывает только файлы нужных дней и только нужные
+    колонки; Feather читается через memory map.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_file = os.path.join(path, "index.json")
+        self.extension = ".feather" if HAS_PYARROW else ".npz"
+        self._lock = threading.Lock()
+        self.archived_until = None  # все дни раньше этой даты в архиве
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    self.archived_until = datetime.strptime(
+                        json.load(f)['archived_until'], '%Y-%m-%d')
+            except Exception as e:
+                print(f"Ошибка чтения индекса архива заказов: {e}")
+
+    def _partition_days(self):
+        """Дни с файлами в архиве: 'ГГГГ-ММ-ДД' -> путь"""
+        days = {}
+        for name in os.listdir(self.path):
+            stem, extension = os.path.splitext(name)
+            if stem.startswith("orders_") and extension in (".feather", ".npz"):
+                days[stem[len("orders_"):]] = os.path.join(self.path, name)
+        return days
+
+    def _write_partition(self, day, df):
+        path = os.path.join(self.path, f"orders_{day}{self.extension}")
+        tmp_path = path + ".tmp"
+        if HAS_PYARROW:
+            feather.write_feather(pa.Table.from_pandas(df, preserve_index=False),
+                                  tmp_path, compression='uncompressed')
+        else:
+            arrays = {}
+            for column in df.columns:
+                values = df[column]
+                if pd.api.types.is_numeric_dtype(values):
+                    arrays[column] = values.to_numpy()
+                else:
+                    arrays[column] = values.fillna('').astype(str).to_numpy(dtype=str)
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read_partition(path, columns):
+        if path.endswith(".feather"):
+            # Без сжатия Feather читается из отображенного в память файла
+            return feather.read_table(path, columns=columns, memory_map=True)
+        with np.load(path) as arrays:
+            return pd.DataFrame({column: arrays[column]
+                                 for column in (columns or arrays.files)})
+
+    def archive(self, load_orders_since):
+        """Запись в архив дней, закрытых с прошлого раза. Возвращает число дней"""
+        with self._lock:
+            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            if self.archived_until == today:
+                return 0
+            df = load_orders_since(self.archived_until or datetime.min)
+            dates = AnalyticsAggregates.parse_dates(df['Дата'])
+            closed = dates < today
+            days = dates[closed].dt.strftime('%Y-%m-%d')
+            for day, rows in df[closed].groupby(days.to_numpy()):
+                self._write_partition(day, rows.reset_index(drop=True))
+
+            self.archived_until = today
+            with open(self.index_file + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump({'archived_until': today.strftime('%Y-%m-%d')}, f)
+            os.replace(self.index_file + ".tmp", self.index_file)
+            return days.nunique()
+
+    def reset(self):
+        """Удаление архива: при следующем archive() он будет собран заново"""
+        with self._lock:
+            for path in self._partition_days().values():
+                os.remove(path)
+            if os.path.exists(self.index_file):
+                os.remove(self.index_file)
+            self.archived_until = None
+
+    def load(self, start=None, end=None, columns=None):
+        """Заказы из архива за дни с start по end (не включая)"""
+        first = start.strftime('%Y-%m-%d') if start else ''
+        last = (end - pd.Timedelta(microseconds=1)).strftime('%Y-%m-%d') if end else '9999'
+        parts = [self._read_partition(path, columns)
+                 for day, path in sorted(self._partition_days().items())
+                 if first <= day <= last]
+        tables = [part for part in parts if not isinstance(part, pd.DataFrame)]
+        frames = [part for part in parts if isinstance(part, pd.DataFrame)]
+        if tables:
+            # Дни пишутся разными запусками archive(), поэтому типы колонок
+            # могут расходиться (Возраст: int64, а в день с пропусками double)
+            frames.insert(0, pa.concat_tables(tables, promote_options="permissive").to_pandas())
+        if not frames:
+            return pd.DataFrame(columns=columns or ORDER_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+
 class DataManager:
     """Менеджер для работы с данными и Excel файлами"""
 
-    def __init__(self):
+    def __init__(self, backend=None):
         self.data_dir = "data"
         self.orders_file = os.path.join(self.data_dir, "orders.xlsx")
         self.inventory_file = os.path.join(self.data_dir, "inventory.xlsx")
+        self.db_file = os.path.join(self.data_dir, "pizza_maker.db")
         self.ensure_data_directory()
+        self._export_lock = threading.Lock()
+        self._orders_dirty = False
+        self._inventory_dirty = False
+        self.inventory = None
+        self.analytics = AnalyticsAggregates(
+            os.path.join(self.data_dir, "analytics.json"))
+        self.daily_sales = DailySalesCache(
+            os.path.join(self.data_dir, "daily_sales.json"))
+        archive_dir = os.path.join(self.data_dir, "archive")
+        os.makedirs(archive_dir, exist_ok=True)
+        self.archive = OrderArchive(archive_dir)
+        # Кэш прочитанных заказов: (ключ версии, DataFrame)
+        self._orders_cache = None
+        self._orders_cache_lock = threading.Lock()
+        self._orders_generation = 0
+        self.orders_cache_hits = 0
+        self.orders_cache_misses = 0
+
+        backend = backend or STORAGE_BACKEND
+        if backend == "sqlite":
+            self.storage = SQLiteStorage(self.db_file)
+            if self.storage.is_new:
+                self.migrate_from_excel()
+        elif backend == "journal":
+            self.storage = JournalStorage(self.data_dir, self.inventory_file)
+            if not self.storage.journal.exists():
+                self.migrate_from_excel()
+        else:
+            raise ValueError(f"Неизвестное хранилище: {backend}")
 
     def ensure_data_directory(self):
         """Создание директории данных если не существует"""
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
 
-    def load_orders(self):
-        """Загрузка заказов из Excel"""
+    def migrate_from_excel(self):
+        """Однократный перенос истории заказов и остатков в хранилище.
+
+        Заказы берутся из журнала, если он есть (он новее периодической
+        выгрузки), иначе из orders.xlsx.
+        """
+        journal = OrderJournal(os.path.join(self.data_dir, "orders_journal.jsonl"))
         try:
-            if os.path.exists(self.orders_file):
+            if (isinstance(self.storage, SQLiteStorage) and journal.exists()):
+                records = journal.read_all()
+            elif os.path.exists(self.orders_file):
                 df = pd.read_excel(self.orders_file)
-                return df
+                records = json.loads(df.to_json(orient='records', force_ascii=False))
             else:
-                return self.create_new_orders_file()
+                records = []
+            if records:
+                self.storage.import_orders(records)
+                print(f"Перенесено заказов в хранилище: {len(records)}")
+        except Exception as e:
+            print(f"Ошибка переноса заказов: {e}")
+
+        try:
+            if (isinstance(self.storage, SQLiteStorage) and
+                    os.path.exists(self.inventory_file)):
+                self.storage.save_inventory(pd.read_excel(self.inventory_file))
+                print("Остатки перенесены в хранилище")
+        except Exception as e:
+            print(f"Ошибка переноса остатков: {e}")
+
+    def _orders_version(self):
+        """Версия заказов: размер и время изменения файлов хранилища
+        и счетчик записей, сделанных самим приложением"""
+        files = []
+        for path in self.storage.order_files():
+            try:
+                stat = os.stat(path)
+                files.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                files.append((path, None, None))
+        return self._orders_generation, tuple(files)
+
+    def load_orders(self, start=None, end=None, columns=None):
+        """Загрузка заказов (копия кэшированного DataFrame).
+
+        Если задан период (start включительно, end не включая) или список
+        колонок, закрытые дни читаются из архива, а остальные - из хранилища.
+        """
+        if start is not None or end is not None or columns is not None:
+            return self._load_orders_range(start, end, columns)
+        with self._orders_cache_lock:
+            version = self._orders_version()
+            if self._orders_cache is not None and self._orders_cache[0] == version:
+                self.orders_cache_hits += 1
+                return self._orders_cache[1].copy()
+            self.orders_cache_misses += 1
+            try:
+                df = self.storage.load_orders()
+            except Exception as e:
+                print(f"Ошибка загрузки заказов: {e}")
+                return pd.DataFrame(columns=ORDER_COLUMNS)
+            self._orders_cache = (version, df)
+            return df.copy()
+
+    def _load_orders_range(self, start, end, columns):
+        read_columns = None
+        if columns is not None:
+            read_columns = list(columns) + (['Дата'] if 'Дата' not in columns else [])
+        try:
+            frames = []
+            archived_until = self.archive.archived_until
+            if archived_until is not None and (start is None or start < archived_until):
+                frames.append(self.archive.load(
+                    start, min(end, archived_until) if end else archived_until,
+                    read_columns))
+            live_start = max(start or datetime.min, archived_until or datetime.min)
+            if end is None or live_start < end:
+                live = self.storage.load_orders_since(live_start)
+                frames.append(live[read_columns] if read_columns else live)
+            df = pd.concat(frames, ignore_index=True)
+        except Exception as e:
+            print(f"Ошибка загрузки заказов: {e}")
+            return pd.DataFrame(columns=columns or ORDER_COLUMNS)
+
+        dates = AnalyticsAggregates.parse_dates(df['Дата'])
+        mask = pd.Series(True, index=df.index)
+        if start is not None:
+            mask &= dates >= start
+        if end is not None:
+            mask &= dates < end
+        df = df[mask].reset_index(drop=True)
+        return df[list(columns)] if columns is not None else df
+
+    def archive_orders(self):
+        """Перенос закрытых дней в колоночный архив"""
+        try:
+            return self.archive.archive(self.load_orders_since)
+        except Exception as e:
+            print(f"Ошибка архивации заказов: {e}")
+            return 0
+
+    def load_orders_since(self, start):
+        """Заказы начиная с start (для дневной статистики)"""
+        try:
+            return self.storage.load_orders_since(start)
         except Exception as e:
             print(f"Ошибка загрузки заказов: {e}")
-            return self.create_new_orders_file()
+            return pd.DataFrame(columns=ORDER_COLUMNS)
+
+    def update_daily_sales(self):
+        try:
+            self.daily_sales.update(self.load_orders_since)
+        except Exception as e:
+            print(f"Ошибка обновления дневной статистики: {e}")
+
+    def orders_cache_stats(self):
+        """Счетчики кэша заказов для мониторинга"""
+        return {
+            'hits': self.orders_cache_hits,
+            'misses': self.orders_cache_misses,
+            'generation': self._orders_generation
+        }
+
+    def invalidate_orders_cache(self):
+        with self._orders_cache_lock:
+            self._orders_generation += 1
+            self._orders_cache = None
 
     def create_new_orders_file(self):
         """Создание нового файла заказов"""
-        df = pd.DataFrame(columns=[
-            'ID', 'Дата', 'ФИО', 'Возраст', 'Заказ', 'Комментарий',
-            'Сумма', 'Оплата', 'Сдача'
-        ])
+        df = pd.DataFrame(columns=ORDER_COLUMNS)
         self.save_orders(df)
         return df
 
@@ -63,24 +1440,118 @@ class DataManager:
             return False
 
     def add_order(self, order_data):
-        """Добавление нового заказа"""
+        """Добавление нового заказа (одна запись в хранилище)"""
         try:
-            df = self.load_orders()
-            new_order_df = pd.DataFrame([order_data])
-            df = pd.concat([df, new_order_df], ignore_index=True)
-            return self.save_orders(df)
+            self.storage.add_order(order_data)
+            self._orders_dirty = True
         except Exception as e:
             print(f"Ошибка добавления заказа: {e}")
             return False
+        finally:
+            self.invalidate_orders_cache()
+        try:
+            self.analytics.add(order_data)
+        except Exception as e:
+            print(f"Ошибка обновления агрегатов аналитики: {e}")
+        return True
+
+    def get_sales_summary(self):
+        """Количество заказов, выручка и средний чек"""
+        try:
+            return self.storage.get_sales_summary()
+        except Exception as e:
+            print(f"Ошибка расчета статистики продаж: {e}")
+            return 0, 0, 0
+
+    def export_orders(self, force=False):
+        """Выгрузка заказов из хранилища в orders.xlsx"""
+        with self._export_lock:
+            if not force and not self._orders_dirty and os.path.exists(self.orders_file):
+                return True
+            self._orders_dirty = False
+            self.storage.flush()
+            if self.save_orders(self.load_orders()):
+                return True
+            self._orders_dirty = True
+            return False
+
+    def export_inventory(self, force=False):
+        """Выгрузка остатков из хранилища в inventory.xlsx для бухгалтерии"""
+        if isinstance(self.storage, JournalStorage):
+            return True
+        with self._export_lock:
+            if not force and not self._inventory_dirty and os.path.exists(self.inventory_file):
+                return True
+            self._inventory_dirty = False
+            try:
+                self.load_inventory().to_excel(self.inventory_file, index=False)
+                return True
+            except Exception as e:
+                print(f"Ошибка выгрузки остатков: {e}")
+                self._inventory_dirty = True
+                return False
+
+    def export_to_excel(self, force=False):
+        """Выгрузка заказов и остатков в Excel"""
+        orders_ok = self.export_orders(force)
+        inventory_ok = self.export_inventory(force)
+        return orders_ok and inventory_ok
+
+    def close(self, export=True):
+        """Финальная выгрузка в Excel и закрытие хранилища"""
+        if self.inventory is not None:
+            self.inventory.close()
+        if export:
+            self.export_to_excel()
+        self.storage.close()
+
+    def load_analytics(self):
+        """Загрузка агрегатов аналитики (с пересчетом при расхождении)"""
+        try:
+            self.analytics.load(self.storage.count_orders(), self.load_orders)
+        except Exception as e:
+            print(f"Ошибка загрузки агрегатов аналитики: {e}")
+
+    def rebuild_analytics(self):
+        """Пересчет агрегатов аналитики по всем заказам"""
+        self.analytics.rebuild(self.load_orders())
+        self.daily_sales.reset()
+        self.update_daily_sales()
+        return self.analytics.totals()[0]
+
+    def load_inventory_cache(self):
+        """Загрузка остатков в память для быстрых списаний"""
+        cache = InventoryCache(self.storage,
+                               os.path.join(self.data_dir, "inventory.wal"))
+        cache.load(self.load_inventory_records())
+        cache.start()
+        self.inventory = cache
+
+    def load_inventory_records(self):
+        """Остатки из хранилища списком словарей"""
+        try:
+            records = self.storage.load_inventory_records()
+            if records is not None:
+                return records
+        except Exception as e:
+            print(f"Ошибка загрузки остатков: {e}")
+        return self.create_new_inventory_file().to_dict('records')
+
+    def inventory_products(self):
+        """Названия продуктов на складе"""
+        if self.inventory is not None:
+            return list(self.inventory.items)
+        return self.load_inventory()['Продукт'].tolist()
 
     def load_inventory(self):
-        """Загрузка остатков из Excel"""
+        """Загрузка остатков из хранилища"""
+        if self.inventory is not None:
+            return self.inventory.to_dataframe()
         try:
-            if os.path.exists(self.inventory_file):
-                df = pd.read_excel(self.inventory_file)
+            df = self.storage.load_inventory()
+            if df is not None:
                 return df
-            else:
-                return self.create_new_inventory_file()
+            return self.create_new_inventory_file()
         except Exception as e:
             print(f"Ошибка загрузки остатков: {e}")
             return self.create_new_inventory_file()
@@ -112,87 +1583,201 @@ class DataManager:
         return df
 
     def save_inventory(self, df):
-        """Сохранение остатков в Excel"""
+        """Сохранение остатков в хранилище"""
         try:
-            df.to_excel(self.inventory_file, index=False)
+            self.storage.save_inventory(df)
+            if self.inventory is not None:
+                self.inventory.load(df.to_dict('records'), recover=False)
+            self._inventory_dirty = True
             return True
         except Exception as e:
             print(f"Ошибка сохранения остатков: {e}")
             return False
 
-    def update_inventory(self, order_items):
-        """Обновление остатков на основе заказа"""
+    def update_inventory(self, deductions):
+        """Обновление остатков: deductions - список пар (продукт, количество).
+
+        Возвращает список продуктов с низким запасом или None при ошибке.
+        """
         try:
-            df = self.load_inventory()
+            if self.inventory is None and self.storage.load_inventory() is None:
+                self.create_new_inventory_file()
 
-            for item in order_items:
-                item_lower = item.lower()
-
-                # Учет пицц
-                if "пицца" in item_lower:
-                    self._decrement_product(df, "Тесто", 1)
-                    self._decrement_product(df, "Сыр", 0.2)
-                    self._decrement_product(df, "Томатный соус", 0.1)
-
-                # Учет начинок
-                toppings_mapping = {
-                    'пепперони': 'Пепперони',
-                    'ветчина': 'Ветчина',
-                    'бекон': 'Бекон',
-                    'грибы': 'Грибы',
-                    'перец': 'Перец',
-                    'лук': 'Лук',
-                    'оливки': 'Оливки',
-                    'ананасы': 'Ананасы'
-                }
+            if self.inventory is not None:
+                low_stock_products = self.inventory.decrement(deductions)
+            else:
+                self.storage.decrement_inventory(deductions)
+                low_stock_products = self.storage.get_low_stock()
+            self._inventory_dirty = True
+            return low_stock_products
 
-                for topping_key, product_name in toppings_mapping.items():
-                    if topping_key in item_lower:
-                        self._decrement_product(df, product_name, 0.05)
-
-                # Учет напитков
-                drinks_mapping = {
-                    'кола': 'Кола',
-                    'фанта': 'Фанта',
-                    'спрайт': 'Спрайт',
-                    'вода': 'Вода',
-                    'сок': 'Сок'
-                }
+        except Exception as e:
+            print(f"Ошибка обновления остатков: {e}")
+            return None
 
-                for drink_key, product_name in drinks_mapping.items():
-                    if drink_key in item_lower:
-                        self._decrement_product(df, product_name, 1)
 
-            # Проверка минимальных запасов
-            low_stock = df[df['Количество'] <= df['Минимальный_запас']]
-            if not low_stock.empty:
-                low_stock_products = low_stock['Продукт'].tolist()
-                messagebox.showwarning(
-                    "Внимание",
-                    f"Низкий запас продуктов:\n{', '.join(low_stock_products)}"
-                )
+class MenuSearchIndex:
+    """Поисковый индекс меню по названиям и составу.
 
-            return self.save_inventory(df)
+    Слова названия и ингредиентов приводятся к casefold; для каждого
+    префикса каждого слова заранее хранится множество позиций. Запрос -
+    пересечение множеств по словам запроса, без перебора меню.
+    """
 
-        except Exception as e:
-            print(f"Ошибка обновления остатков: {e}")
-            return False
+    WORD = re.compile(r"\w+")
+
+    def __init__(self, menu):
+        self.menu = menu
+        self.items = []  # (категория, название) в порядке меню
+        self.prefixes = {}  # префикс -> множество номеров позиций
+        for category, entries in menu.items():
+            for name, info in entries.items():
+                item_id = len(self.items)
+                self.items.append((category, name))
+                text = f"{name} {info.get('ингредиенты', '')}"
+                for word in set(self.tokenize(text)):
+                    for length in range(1, len(word) + 1):
+                        self.prefixes.setdefault(word[:length], set()).add(item_id)
+
+    @classmethod
+    def tokenize(cls, text):
+        return cls.WORD.findall(text.replace('_', ' ').casefold())
 
-    def _decrement_product(self, df, product_name, amount):
-        """Уменьшение количества продукта"""
-        mask = df['Продукт'] == product_name
-        if mask.any():
-            current_value = df.loc[mask, 'Количество'].iloc[0]
-            if current_value >= amount:
-                df.loc[mask, 'Количество'] = current_value - amount
+    def search(self, query):
+        """Найденные позиции по категориям: {категория: [название]}.
+
+        Каждое слово запроса - префикс слова в названии или составе;
+        пустой запрос находит все меню.
+        """
+        words = self.tokenize(query)
+        if words:
+            sets = sorted((self.prefixes.get(word, set()) for word in words), key=len)
+            found = sorted(set.intersection(*sets)) if sets[0] else []
+        else:
+            found = range(len(self.items))
+
+        result = {category: [] for category in self.menu}
+        for item_id in found:
+            category, name = self.items[item_id]
+            result[category].append(name)
+        return result
 
 
 class ConfigManager:
-    """Менеджер конфигурационных файлов"""
+    """Менеджер конфигурационных файлов.
+
+    Разобранные конфиги кэшируются: файл читается заново, только если
+    изменились его размер или время изменения, либо после invalidate().
+    Возвращаемые объекты общие для всех вызовов - их нельзя изменять.
+
+    Сохранение нескольких файлов - одна транзакция (commit): все файлы
+    сначала пишутся во временные и сбрасываются на диск, затем заменяют
+    старые; разобранные конфиги сразу кладутся в кэш.
+    """
 
     def __init__(self):
         self.config_dir = "config"
         self.ensure_config_directory()
+        self._cache = {}  # путь -> (версия файла, разобранный конфиг)
+        self.search_indexes = {}  # файл меню -> MenuSearchIndex
+        self._cache_lock = threading.Lock()
+        self.generation = 0  # растет при каждом разборе файла и сбросе кэша
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @staticmethod
+    def _file_version(path):
+        try:
+            stat = os.stat(path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _cached(self, path, parse):
+        """Конфиг из кэша или разбор файла, если он изменился"""
+        version = self._file_version(path)
+        with self._cache_lock:
+            entry = self._cache.get(path)
+            if entry is not None and entry[0] == version:
+                self.cache_hits += 1
+                return entry[1]
+        value = parse()
+        with self._cache_lock:
+            self.cache_misses += 1
+            self.generation += 1
+            self._cache[path] = (version, value)
+        return value
+
+    def invalidate(self, path=None):
+        """Сброс кэша одного файла или всех конфигов"""
+        with self._cache_lock:
+            if path is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(path, None)
+            self.generation += 1
+
+    @staticmethod
+    def _read_config(path, text=None):
+        """ConfigParser из файла или из уже готового текста"""
+        config = configparser.ConfigParser()
+        if text is None:
+            config.read(path, encoding='utf-8')
+        else:
+            config.read_string(text)
+        return config
+
+    @staticmethod
+    def _render_config(config):
+        buffer = io.StringIO()
+        config.write(buffer)
+        return buffer.getvalue()
+
+    def _parser(self, path):
+        """Разбор текста конфига тем же кодом, что и при загрузке файла"""
+        name = os.path.basename(path)
+        parsers = {
+            'receipt_config.txt': self._parse_receipt_config,
+            'discounts_config.txt': self._parse_discounts_config,
+            'toppings.txt': self._parse_toppings
+        }
+        if name in parsers:
+            return lambda text: parsers[name](text, strict=True)
+        return lambda text: self._parse_menu_config(name, text, strict=True)
+
+    def commit(self, files):
+        """Транзакционное сохранение конфигов: путь -> текст файла.
+
+        Тексты разбираются до записи в строгом режиме (strict=True): ошибка
+        разбора отменяет всю транзакцию, а не подменяет конфиг значениями
+        по умолчанию. Временные файлы сбрасываются на диск (fsync) и только потом
+        атомарно заменяют старые. Кэш получает разобранные объекты без
+        повторного чтения файлов, поколение растет один раз на транзакцию.
+        """
+        parsed = {path: self._parser(path)(text) for path, text in files.items()}
+
+        tmp_paths = []
+        try:
+            for path, text in files.items():
+                tmp_path = path + '.tmp'
+                tmp_paths.append(tmp_path)
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                    f.flush()
+                    os.fsync(f.fileno())
+        except Exception:
+            for tmp_path in tmp_paths:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            raise
+
+        with self._cache_lock:
+            for path in files:
+                os.replace(path + '.tmp', path)
+            for path, value in parsed.items():
+                self._cache[path] = (self._file_version(path), value)
+            self.generation += 1
+        return parsed
 
     def ensure_config_directory(self):
         """Создание директории конфигов если не существует"""
@@ -201,13 +1786,17 @@ class ConfigManager:
 
     def load_receipt_config(self):
         """Загрузка настроек чека"""
-        config = configparser.ConfigParser()
+        return self._cached('config/receipt_config.txt', self._parse_receipt_config)
+
+    def _parse_receipt_config(self, text=None, strict=False):
         try:
-            config.read('config/receipt_config.txt', encoding='utf-8')
+            config = self._read_config('config/receipt_config.txt', text)
             if not config.sections():
-                raise FileNotFoundError
+                raise FileNotFoundError("config/receipt_config.txt")
             return config
         except Exception as e:
+            if strict:
+                raise
             print(f"Ошибка загрузки настроек чека: {e}")
             return self.create_default_receipt_config()
 
@@ -229,6 +1818,9 @@ class ConfigManager:
 
     def load_images_config(self):
         """Загрузка конфигурации изображений"""
+        return self._cached('config/images_config.txt', self._parse_images_config)
+
+    def _parse_images_config(self):
         images_config = {"Пиццы": {}, "Напитки": {}}
         try:
             config = configparser.ConfigParser()
@@ -249,14 +1841,16 @@ class ConfigManager:
 
     def load_discounts_config(self):
         """Загрузка конфигурации скидок"""
+        return self._cached('config/discounts_config.txt', self._parse_discounts_config)
+
+    def _parse_discounts_config(self, text=None, strict=False):
         discounts = {
             "напитки": {},
             "пиццы_взрослые": {},
             "пиццы_детские": {}
         }
         try:
-            config = configparser.ConfigParser()
-            config.read('config/discounts_config.txt', encoding='utf-8')
+            config = self._read_config('config/discounts_config.txt', text)
 
             if 'Скидки_напитки' in config:
                 for volume, discount in config['Скидки_напитки'].items():
@@ -271,6 +1865,8 @@ class ConfigManager:
                     discounts["пиццы_детские"][size] = float(multiplier)
 
         except Exception as e:
+            if strict:
+                raise
             print(f"Ошибка загрузки конфигурации скидок: {e}")
             discounts = {
                 "напитки": {"0.33л": 0.0, "0.5л": 5.0, "1л": 10.0, "1.5л": 15.0, "2л": 20.0},
@@ -281,11 +1877,24 @@ class ConfigManager:
         return discounts
 
     def load_menu_config(self, menu_file):
-        """Загрузка меню из файла"""
+        """Загрузка меню из файла; поисковый индекс строится вместе с меню"""
+        menu = self._cached(f'config/{menu_file}',
+                            lambda: self._parse_menu_config(menu_file))
+        index = self.search_indexes.get(menu_file)
+        if index is None or index.menu is not menu:
+            self.search_indexes[menu_file] = MenuSearchIndex(menu)
+        return menu
+
+    def search_index(self, menu_file):
+        """Поисковый индекс меню (строится при загрузке меню)"""
+        if menu_file not in self.search_indexes:
+            self.load_menu_config(menu_file)
+        return self.search_indexes[menu_file]
+
+    def _parse_menu_config(self, menu_file, text=None, strict=False):
         menu = {"Пиццы": {}, "Напитки": {}}
         try:
-            config = configparser.ConfigParser()
-            config.read(f'config/{menu_file}', encoding='utf-8')
+            config = self._read_config(f'config/{menu_file}', text)
 
             if 'Пиццы' in config:
                 for pizza, value in config['Пиццы'].items():
@@ -297,6 +1906,8 @@ class ConfigManager:
                             "ингредиенты": ingredients
                         }
                     except ValueError as e:
+                        if strict:
+                            raise ValueError(f"пицца {pizza}: {e}")
                         print(f"Ошибка парсинга пиццы {pizza}: {e}")
 
             if 'Напитки' in config:
@@ -305,10 +1916,14 @@ class ConfigManager:
                         price, volume = value.split('|')
                         menu["Напитки"][drink] = {"цена": int(price), "объем": volume}
                     except ValueError as e:
+                        if strict:
+                            raise ValueError(f"напиток {drink}: {e}")
                         print(f"Ошибка парсинга напитка {drink}: {e}")
 
             return menu
         except Exception as e:
+            if strict:
+                raise
             print(f"Ошибка загрузки меню {menu_file}: {e}")
             return self.create_default_menu(menu_file)
 
@@ -359,16 +1974,23 @@ class ConfigManager:
 
     def load_toppings(self):
         """Загрузка начинок"""
+        return self._cached('config/toppings.txt', self._parse_toppings)
+
+    def _parse_toppings(self, text=None, strict=False):
         toppings = {}
         try:
-            with open('config/toppings.txt', 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if '=' in line:
-                        topping, price = line.split('=')
-                        toppings[topping] = int(price)
+            if text is None:
+                with open('config/toppings.txt', 'r', encoding='utf-8') as f:
+                    text = f.read()
+            for line in text.splitlines():
+                line = line.strip()
+                if '=' in line:
+                    topping, price = line.split('=')
+                    toppings[topping] = int(price)
             return toppings
         except FileNotFoundError:
+            if strict:
+                raise
             print("Файл начинок не найден, создание по умолчанию")
             return self.create_default_toppings()
 
@@ -390,15 +2012,85 @@ class ConfigManager:
             'Пармезан': 65
         }
 
-    def save_receipt_config(self, config_data):
-        """Сохранение настроек чека"""
+    def load_recipes(self):
+        """Загрузка рецептур (списание продуктов на позицию меню)"""
+        return self._cached('config/recipes.txt', self._parse_recipes)
+
+    def _parse_recipes(self):
+        recipes = {"основа": {}, "пиццы": {}, "размеры": {}, "начинки": {},
+                   "напитки": {}}
+        sections = {'Основа': "основа", 'Пиццы': "пиццы", 'Размеры': "размеры",
+                    'Начинки': "начинки", 'Напитки': "напитки"}
         try:
             config = configparser.ConfigParser()
-            config['Чек'] = config_data['receipt']
-            config['QR'] = config_data['qr']
+            config.read('config/recipes.txt', encoding='utf-8')
+            if not config.sections():
+                raise FileNotFoundError("config/recipes.txt")
+
+            for section, key in sections.items():
+                if section in config:
+                    for name, value in config[section].items():
+                        recipes[key][name] = value
+            return recipes
+        except Exception as e:
+            print(f"Ошибка загрузки рецептур: {e}")
+            return self.create_default_recipes()
+
+    def create_default_recipes(self):
+        """Рецептуры по умолчанию"""
+        return {
+            "основа": {"пицца": "Тесто:1, Томатный соус:0.1"},
+            "пиццы": {},
+            "размеры": {"маленькая": "0.6", "средняя": "0.8", "большая": "1.0"},
+            "начинки": {},
+            "напитки": {}
+        }
+
+    def render_receipt_config(self, config_data):
+        """Текст файла настроек чека"""
+        config = configparser.ConfigParser()
+        # "%" в значениях (НДС=20%) экранируется для интерполяции configparser
+        for section, key in (('Чек', 'receipt'), ('QR', 'qr')):
+            config[section] = {name: str(value).replace('%', '%%')
+                               for name, value in config_data[key].items()}
+        return self._render_config(config)
+
+    def render_menu_config(self, menu_data):
+        """Текст файла меню"""
+        config = configparser.ConfigParser()
+
+        # Пиццы
+        config['Пиццы'] = {}
+        for pizza, info in menu_data["Пиццы"].items():
+            config['Пиццы'][pizza.replace(' ', '_')] = f"{info['цена']}|{info['размер']}|{info['ингредиенты']}"
+
+        # Напитки
+        config['Напитки'] = {}
+        for drink, info in menu_data["Напитки"].items():
+            config['Напитки'][drink] = f"{info['цена']}|{info['объем']}"
+
+        return self._render_config(config)
 
-            with open('config/receipt_config.txt', 'w', encoding='utf-8') as f:
-                config.write(f)
+    def render_toppings(self, toppings_data):
+        """Текст файла начинок"""
+        return "".join(f"{topping}={price}\n" for topping, price in toppings_data.items())
+
+    def render_discounts(self, discounts_data):
+        """Текст файла скидок; секции пицц без изменений берутся из текущих"""
+        current = self.load_discounts_config()
+        config = configparser.ConfigParser()
+        sections = {'Скидки_напитки': "напитки", 'Скидки_пиццы': "пиццы_взрослые",
+                    'Скидки_детские': "пиццы_детские"}
+        for section, key in sections.items():
+            values = discounts_data.get(key, current[key])
+            config[section] = {name: str(value) for name, value in values.items()}
+        return self._render_config(config)
+
+    def save_receipt_config(self, config_data):
+        """Сохранение настроек чека"""
+        try:
+            self.commit({'config/receipt_config.txt':
+                         self.render_receipt_config(config_data)})
             return True
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка сохранения настроек чека: {e}")
@@ -407,20 +2099,7 @@ class ConfigManager:
     def save_menu_config(self, menu_data, menu_file):
         """Сохранение меню в файл"""
         try:
-            config = configparser.ConfigParser()
-
-            # Пиццы
-            config['Пиццы'] = {}
-            for pizza, info in menu_data["Пиццы"].items():
-                config['Пиццы'][pizza.replace(' ', '_')] = f"{info['цена']}|{info['размер']}|{info['ингредиенты']}"
-
-            # Напитки
-            config['Напитки'] = {}
-            for drink, info in menu_data["Напитки"].items():
-                config['Напитки'][drink] = f"{info['цена']}|{info['объем']}"
-
-            with open(f'config/{menu_file}', 'w', encoding='utf-8') as f:
-                config.write(f)
+            self.commit({f'config/{menu_file}': self.render_menu_config(menu_data)})
             return True
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка сохранения меню: {e}")
@@ -429,9 +2108,7 @@ class ConfigManager:
     def save_toppings(self, toppings_data):
         """Сохранение начинок"""
         try:
-            with open('config/toppings.txt', 'w', encoding='utf-8') as f:
-                for topping, price in toppings_data.items():
-                    f.write(f"{topping}={price}\n")
+            self.commit({'config/toppings.txt': self.render_toppings(toppings_data)})
             return True
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка сохранения начинок: {e}")
@@ -440,20 +2117,244 @@ class ConfigManager:
     def save_discounts(self, discounts_data):
         """Сохранение настроек скидок"""
         try:
-            with open('config/discounts_config.txt', 'w', encoding='utf-8') as f:
-                for volume, discount in discounts_data["напитки"].items():
-                    f.write(f"{volume}={discount}\n")
+            self.commit({'config/discounts_config.txt':
+                         self.render_discounts(discounts_data)})
             return True
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка сохранения скидок: {e}")
             return False
 
 
-class ImageManager:
-    """Менеджер для работы с изображениями"""
+class RecipeBook:
+    """Рецептуры, скомпилированные в таблицу списаний.
 
-    def __init__(self):
-        self.image_cache = {}
+    Для каждой позиции меню заранее считается вектор списания - кортеж пар
+    (продукт, количество), поэтому обновление остатков по заказу - это
+    сложение готовых векторов без разбора строк корзины.
+    """
+
+    # Расход начинки, если для нее нет строки в рецептурах
+    DEFAULT_TOPPING_AMOUNT = 0.05
+
+    def __init__(self, recipes, menus, toppings, products):
+        self.table = {}
+        self.size_multipliers = {
+            size.casefold(): float(multiplier)
+            for size, multiplier in recipes["размеры"].items()
+        }
+        self.base = self.parse(recipes["основа"].get("пицца", ""))
+        self.pizzas = {
+            name.casefold(): self.parse(value)
+            for name, value in recipes["пиццы"].items()
+        }
+        self.toppings = {
+            name.casefold(): self.parse(value)
+            for name, value in recipes["начинки"].items()
+        }
+        self.drinks = {
+            name.casefold(): self.parse(value)
+            for name, value in recipes["напитки"].items()
+        }
+        self.products = {product.casefold(): product for product in products}
+
+        for topping in toppings:
+            if topping.casefold() not in self.toppings:
+                self.toppings[topping.casefold()] = self._guess(topping)
+
+        for menu in menus:
+            for pizza, info in menu["Пиццы"].items():
+                pizza_id = pizza.casefold()
+                if pizza_id not in self.pizzas:
+                    print(f"Нет рецептуры для пиццы {pizza}, расход по составу")
+                    self.pizzas[pizza_id] = self._guess(info.get("ингредиенты", ""))
+                for size in self.size_multipliers:
+                    self.table[("pizza", pizza_id, size)] = self._pizza_vector(
+                        pizza_id, size)
+            for drink in menu["Напитки"]:
+                drink_id = drink.casefold()
+                self.table[("drink", drink_id)] = self.drinks.get(
+                    drink_id, self._guess(drink, amount=1))
+
+    @staticmethod
+    def parse(value):
+        """'Сыр:0.2, Томатный соус:0.1' -> (('Сыр', 0.2), ('Томатный соус', 0.1))"""
+        vector = []
+        for part in value.split(','):
+            if ':' not in part:
+                continue
+            product, amount = part.rsplit(':', 1)
+            vector.append((product.strip(), float(amount)))
+        return tuple(vector)
+
+    @staticmethod
+    def combine(*vectors, multiplier=1.0):
+        """Сумма векторов списания"""
+        total = {}
+        for vector in vectors:
+            for product, amount in vector:
+                total[product] = total.get(product, 0) + amount * multiplier
+        return tuple((product, round(amount, 6)) for product, amount in total.items())
+
+    def _guess(self, text, amount=DEFAULT_TOPPING_AMOUNT):
+        """Вектор по названиям продуктов склада, найденным в тексте"""
+        words = [word.strip().casefold() for word in text.split(',')]
+        return tuple((self.products[word], amount) for word in words
+                     if word in self.products)
+
+    def _pizza_vector(self, pizza_id, size, toppings=()):
+        multiplier = self.size_multipliers.get(size, 1.0)
+        extra = [self.toppings.get(topping.casefold(), ()) for topping in toppings]
+        scaled = self.combine(self.pizzas.get(pizza_id, ()), *extra,
+                              multiplier=multiplier)
+        return self.combine(self.base, scaled)
+
+    @staticmethod
+    def line_key(line):
+        """Ключ таблицы списаний для строки корзины"""
+        product = line.product.casefold()
+        if line.kind == "drink":
+            return ("drink", product)
+        size = (line.variant or "большая").casefold()
+        if line.kind == "pizza":
+            return ("pizza", product, size)
+        return (line.kind, product, size, tuple(sorted(line.toppings)))
+
+    def vector(self, line):
+        """Вектор списания для строки корзины"""
+        key = self.line_key(line)
+        vector = self.table.get(key)
+        if vector is None:
+            # Сочетания начинок кастомной пиццы и позиции вне меню
+            if key[0] == "drink":
+                vector = self.drinks.get(key[1], ())
+            else:
+                vector = self._pizza_vector(key[1], key[2], line.toppings)
+            self.table[key] = vector
+        return vector
+
+    def deductions(self, lines):
+        """Суммарный вектор списания по заказу"""
+        vectors = []
+        for line in lines:
+            vector = self.vector(line)
+            vectors.append(vector if line.quantity == 1 else
+                           self.combine(vector, multiplier=line.quantity))
+        return list(self.combine(*vectors))
+
+
+class PriceTable:
+    """Цены, скомпилированные при загрузке конфигурации.
+
+    Для каждой аудитории (взрослое и детское меню) заранее считаются цены
+    всех пицц во всех размерах и напитков во всех объемах с учетом скидок.
+    Таблица неизменяема: меню, корзина и чек берут цены из одного места,
+    поэтому расходиться они не могут.
+    """
+
+    AUDIENCES = ("adult", "minor")
+    DRINK_VOLUMES = ("0.33л", "0.5л", "1л", "1.5л", "2л")
+    # Основа кастомной пиццы, если в меню нет позиции "Кастомная"
+    DEFAULT_CUSTOM_BASE = {"adult": 400, "minor": 300}
+
+    def __init__(self, menus, discounts, toppings):
+        prices = {}
+        sizes = {}
+        default_sizes = {}
+        custom_base = dict(self.DEFAULT_CUSTOM_BASE)
+        multipliers_by_audience = {
+            "adult": discounts["пиццы_взрослые"],
+            "minor": discounts["пиццы_детские"]
+        }
+        volumes = list(self.DRINK_VOLUMES)
+        volumes += [volume for volume in discounts["напитки"] if volume not in volumes]
+
+        for audience, menu in zip(self.AUDIENCES, menus):
+            multipliers = multipliers_by_audience[audience]
+            sizes[audience] = tuple(multipliers)
+            by_casefold = {size.casefold(): size for size in multipliers}
+            for pizza, info in menu["Пиццы"].items():
+                if pizza.casefold() == "кастомная":
+                    custom_base[audience] = info['цена']
+                # Размер из меню приводится к варианту из списка размеров
+                default_size = by_casefold.get(info['размер'].casefold(), info['размер'])
+                default_sizes[(audience, pizza)] = default_size
+                for size in set(multipliers) | {default_size}:
+                    prices[(audience, "pizza", pizza, size)] = (
+                        int(info['цена'] * multipliers.get(size, 1.0)), 0.0)
+            for drink, info in menu["Напитки"].items():
+                for volume in set(volumes) | {info['объем']}:
+                    discount = discounts["напитки"].get(volume, 0.0)
+                    prices[(audience, "drink", drink, volume)] = (
+                        int(info['цена'] * (1 - discount / 100)), discount)
+
+        self.prices = MappingProxyType(prices)
+        self.sizes = MappingProxyType(sizes)
+        self.default_sizes = MappingProxyType(default_sizes)
+        self.volumes = tuple(volumes)
+        self.volume_labels = MappingProxyType({
+            volume: self._volume_label(volume, discounts["напитки"].get(volume, 0.0))
+            for volume in volumes
+        })
+        self.toppings = MappingProxyType(dict(toppings))
+        self.custom_base = MappingProxyType(custom_base)
+
+    @staticmethod
+    def _volume_label(volume, discount):
+        return f"{volume} (-{discount}%)" if discount > 0 else volume
+
+    @staticmethod
+    def audience(is_adult):
+        return "adult" if is_adult else "minor"
+
+    def price(self, audience, kind, product, variant):
+        """Цена за единицу со скидкой: (цена, скидка в %)"""
+        return self.prices[(audience, kind, product, variant)]
+
+    def line(self, audience, kind, product, variant):
+        """Строка корзины с ценой из таблицы"""
+        price, discount = self.price(audience, kind, product, variant)
+        return CartLine(kind, product, variant, unit_price=price, discount=discount)
+
+    def custom_line(self, audience, toppings):
+        return CartLine("custom", "кастомная", toppings=tuple(sorted(toppings)),
+                        unit_price=self.custom_price(audience, toppings))
+
+    def custom_price(self, audience, toppings):
+        return self.custom_base[audience] + sum(self.toppings[t] for t in toppings)
+
+    def reprice(self, audience, line):
+        """(цена, скидка) строки корзины по текущей таблице;
+        None - позиции больше нет в меню"""
+        if line.kind == "custom":
+            if all(topping in self.toppings for topping in line.toppings):
+                return self.custom_price(audience, line.toppings), 0.0
+            return None
+        return self.prices.get((audience, line.kind, line.product, line.variant))
+
+
+class ImageManager:
+    """Менеджер для работы с изображениями.
+
+    Кэш LRU по ключу (путь, размер, mtime) с ограничением по памяти.
+    Декодирование и масштабирование выполняются в фоновом потоке
+    (prewarm), в потоке Tk создается только PhotoImage.
+
+    Уменьшенные копии сохраняются в cache/thumbnails (имя - хэш пути и
+    размер) с mtime исходного файла, поэтому после первого запуска
+    картинки не масштабируются заново, пока исходник не изменится.
+    """
+
+    # Размеры картинок в меню
+    MENU_SIZES = {"Пиццы": (120, 90), "Напитки": (80, 80)}
+
+    def __init__(self, memory_budget=32 * 1024 * 1024, thumbnails_dir="cache/thumbnails"):
+        self.memory_budget = memory_budget
+        self.thumbnails_dir = thumbnails_dir
+        self.memory_used = 0
+        self._cache = OrderedDict()  # ключ -> [PIL.Image, PhotoImage или None]
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
         self.default_image = self.create_default_image()
 
     def create_default_image(self):
@@ -461,86 +2362,971 @@ class ImageManager:
         img = Image.new('RGB', (200, 150), color='lightgray')
         return ImageTk.PhotoImage(img)
 
-    def load_image(self, image_path, size=(200, 150)):
-        """Загрузка и масштабирование изображения"""
+    @staticmethod
+    def cache_key(image_path, size):
         try:
-            if image_path in self.image_cache:
-                return self.image_cache[image_path]
-
-            if os.path.exists(image_path):
-                image = Image.open(image_path)
-                image = image.resize(size, Image.Resampling.LANCZOS)
-                photo = ImageTk.PhotoImage(image)
-                self.image_cache[image_path] = photo
-                return photo
+            return image_path, tuple(size), os.stat(image_path).st_mtime_ns
+        except OSError:
+            return None
+
+    @staticmethod
+    def image_cost(image):
+        """Примерный объем памяти: RGBA, 4 байта на пиксель"""
+        return image.width * image.height * 4
+
+    def _evict(self):
+        while self.memory_used > self.memory_budget and len(self._cache) > 1:
+            _, (image, _) = self._cache.popitem(last=False)
+            self.memory_used -= self.image_cost(image)
+
+    def decode(self, image_path, size):
+        """Открытие и масштабирование (можно вызывать из любого потока)"""
+        key = self.cache_key(image_path, size)
+        if key is None:
+            return None, None
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+                return key, entry[0]
+
+        image = self.thumbnail(image_path, tuple(size), key[2])
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self._cache[key] = [image, None]
+                self.memory_used += self.image_cost(image)
+                self._evict()
             else:
+                image = entry[0]
+        return key, image
+
+    def thumbnail_path(self, image_path, size):
+        digest = hashlib.sha1(os.path.abspath(image_path).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.thumbnails_dir, f"{digest}_{size[0]}x{size[1]}.png")
+
+    def thumbnail(self, image_path, size, mtime_ns):
+        """Уменьшенная копия с диска или масштабирование исходника"""
+        path = self.thumbnail_path(image_path, size)
+        try:
+            if os.stat(path).st_mtime_ns == mtime_ns:
+                with Image.open(path) as image:
+                    image.load()
+                    return image.copy()
+        except OSError:
+            pass
+
+        with Image.open(image_path) as image:
+            # JPEG декодируется сразу в уменьшенном масштабе (1/2 ... 1/8)
+            image.draft('RGB', size)
+            image = image.resize(size, Image.Resampling.LANCZOS)
+
+        try:
+            os.makedirs(self.thumbnails_dir, exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            image.save(tmp_path, format="PNG")
+            os.utime(tmp_path, ns=(mtime_ns, mtime_ns))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Ошибка сохранения миниатюры {path}: {e}")
+        return image
+
+    def prewarm(self, images_config, sizes=None):
+        """Фоновое декодирование всех картинок меню"""
+        sizes = sizes or self.MENU_SIZES
+        jobs = [(path, sizes[category])
+                for category, images in images_config.items() if category in sizes
+                for path in images.values() if path]
+
+        def run():
+            for image_path, size in jobs:
+                try:
+                    self.decode(image_path, size)
+                except Exception as e:
+                    print(f"Ошибка загрузки изображения {image_path}: {e}")
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def load_image(self, image_path, size=(200, 150)):
+        """Загрузка и масштабирование изображения (поток Tk)"""
+        try:
+            key = self.cache_key(image_path, size)
+            if key is None:
                 print(f"Изображение не найдено: {image_path}")
                 return self.default_image
+
+            with self._lock:
+                entry = self._cache.get(key)
+                if entry is not None and entry[1] is not None:
+                    self._cache.move_to_end(key)
+                    self.cache_hits += 1
+                    return entry[1]
+                self.cache_misses += 1
+
+            key, image = self.decode(image_path, size)
+            photo = ImageTk.PhotoImage(image)
+            with self._lock:
+                entry = self._cache.get(key)
+                if entry is not None:
+                    entry[1] = photo
+            return photo
         except Exception as e:
             print(f"Ошибка загрузки изображения {image_path}: {e}")
             return self.default_image
 
 
-class AnalyticsManager:
-    """Менеджер аналитики"""
+class AnalyticsManager:
+    """Менеджер аналитики"""
+
+    WEEKDAYS = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница',
+                'Суббота', 'Воскресенье']
+
+    def __init__(self, data_manager):
+        self.data_manager = data_manager
+
+    def load_orders_data(self):
+        """Загрузка данных о заказах"""
+        return self.data_manager.load_orders()
+
+    @property
+    def aggregates(self):
+        return self.data_manager.analytics
+
+    @staticmethod
+    def filter_by_date(df, start=None, end=None):
+        """Заказы с start (включительно) по end (не включая)"""
+        if start is None and end is None:
+            return df
+        dates = AnalyticsAggregates.parse_dates(df['Дата'])
+        mask = pd.Series(True, index=df.index)
+        if start is not None:
+            mask &= dates >= start
+        if end is not None:
+            mask &= dates < end
+        return df[mask]
+
+    def get_popular_orders(self, top_n=10, start=None, end=None):
+        """Получение самых популярных заказов (за период, если он задан)"""
+        if start is None and end is None:
+            return self.aggregates.most_common(top_n)
+        df = self.data_manager.load_orders(start, end, columns=['Заказ', 'Позиции'])
+        counts = AnalyticsAggregates.count_items(df).head(top_n)
+        return [(title, int(count)) for title, count in counts.items()]
+
+    def get_age_distribution(self):
+        """Получение распределения по возрастам"""
+        return pd.Series(self.aggregates.age_counts(), dtype='int64').sort_index()
+
+    def _time_table(self, start, end):
+        self.data_manager.update_daily_sales()
+        return self.data_manager.daily_sales.table(start, end)
+
+    def get_hourly_sales(self, start=None, end=None):
+        """Количество заказов и выручка по часам (за период, если он задан)"""
+        if start is None and end is None:
+            hours = self.aggregates.hour_buckets()
+        else:
+            hours = self._time_table(start, end).sum(axis=0)
+        return pd.DataFrame(hours, columns=['Заказы', 'Выручка'])
+
+    def get_weekday_sales(self, start=None, end=None):
+        """Количество заказов и выручка по дням недели"""
+        if start is None and end is None:
+            weekdays = self.aggregates.weekday_buckets()
+        else:
+            weekdays = self._time_table(start, end).sum(axis=1)
+        return pd.DataFrame(weekdays, columns=['Заказы', 'Выручка'],
+                            index=self.WEEKDAYS)
+
+    def get_sales_heatmap(self, start=None, end=None):
+        """Количество заказов по дням недели (строки) и часам (столбцы)"""
+        return pd.DataFrame(self._time_table(start, end)[:, :, 0],
+                            index=self.WEEKDAYS, columns=range(24))
+
+    def get_peak_hours(self, top_n=3, start=None, end=None):
+        """Часы с наибольшим числом заказов - для планирования смен"""
+        orders = self.get_hourly_sales(start, end)['Заказы']
+        orders = orders[orders > 0].sort_values(ascending=False, kind='stable')
+        return [(f'{hour:02d}:00', int(count)) for hour, count in orders.head(top_n).items()]
+
+    def get_sales_statistics(self):
+        """Получение статистики продаж"""
+        total_orders, total_revenue = self.aggregates.totals()
+        if not total_orders:
+            return {
+                'total_orders': 0,
+                'total_revenue': 0,
+                'avg_order_value': 0,
+                'most_popular_time': 'Нет данных'
+            }
+
+        hour_orders = [orders for orders, _ in self.aggregates.hour_buckets()]
+        most_popular_hour = hour_orders.index(max(hour_orders))
+        return {
+            'total_orders': total_orders,
+            'total_revenue': total_revenue,
+            'avg_order_value': total_revenue / total_orders,
+            'most_popular_time': f'{most_popular_hour:02d}:00'
+        }
+
+
+class AnalyticsReport:
+    """Отчет аналитики: графики PNG и сводная страница HTML (папка reports).
+
+    Графики строятся без pyplot (Figure + Agg), поэтому отчет собирается в
+    фоновом потоке или из командной строки. Отчет привязан к поколению
+    данных и перерисовывается только после новых заказов.
+    """
+
+    CHARTS = {
+        "popular": "Популярные заказы",
+        "ages": "Распределение по возрастам",
+        "weekday": "Статистика продаж по дням недели",
+        "hourly": "Загрузка по часам",
+    }
+    DPI = 80
+
+    def __init__(self, analytics_manager, output_dir="reports"):
+        self.analytics_manager = analytics_manager
+        self.output_dir = output_dir
+        self.index_file = os.path.join(output_dir, "report.json")
+        self._lock = threading.Lock()
+
+    def generation(self):
+        """Поколение данных: меняется с каждым новым заказом"""
+        orders, revenue = self.analytics_manager.aggregates.totals()
+        return f"{orders}-{revenue}"
+
+    def cached(self):
+        """Графики готового отчета, если он соответствует данным, иначе None"""
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            charts = index['charts']
+            if (index['generation'] == self.generation() and
+                    all(os.path.exists(path) for path in charts.values() if path)):
+                return charts
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def render(self, force=False):
+        """Построение отчета (если он устарел или force)"""
+        with self._lock:
+            if not force:
+                charts = self.cached()
+                if charts is not None:
+                    return charts
+
+            generation = self.generation()
+            os.makedirs(self.output_dir, exist_ok=True)
+            charts = {}
+            for name in self.CHARTS:
+                fig = getattr(self, f"{name}_figure")()
+                if fig is None:
+                    charts[name] = None
+                    continue
+                chart_file = os.path.join(self.output_dir, f"{name}.png")
+                fig.savefig(chart_file, dpi=self.DPI)
+                charts[name] = chart_file
+            self.write_html(charts)
+
+            tmp_path = self.index_file + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'generation': generation, 'charts': charts}, f,
+                          ensure_ascii=False)
+            os.replace(tmp_path, self.index_file)
+            return charts
+
+    def write_html(self, charts):
+        stats = self.analytics_manager.get_sales_statistics()
+        rows = [
+            ("Всего заказов", stats['total_orders']),
+            ("Общая выручка", f"{stats['total_revenue']:.2f} руб."),
+            ("Средний чек", f"{stats['avg_order_value']:.2f} руб."),
+            ("Популярное время", stats['most_popular_time']),
+        ]
+        parts = ['<!DOCTYPE html>', '<html lang="ru"><head><meta charset="utf-8">',
+                 '<title>Pizza Maker - аналитика</title></head><body>',
+                 '<h1>Аналитика Pizza Maker</h1>',
+                 f'<p>Сформирован: {datetime.now().strftime(ORDER_DATE_FORMAT)}</p>',
+                 '<table>']
+        parts += [f'<tr><td>{html.escape(title)}</td><td>{html.escape(str(value))}</td></tr>'
+                  for title, value in rows]
+        parts.append('</table>')
+        for name, title in self.CHARTS.items():
+            parts.append(f'<h2>{html.escape(title)}</h2>')
+            if charts.get(name):
+                parts.append(f'<img src="{name}.png" alt="{html.escape(title)}">')
+            else:
+                parts.append('<p>Нет данных</p>')
+        parts.append('</body></html>')
+        with open(os.path.join(self.output_dir, "index.html"), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(parts))
+
+    def popular_figure(self):
+        """График популярных заказов"""
+        popular_orders = self.analytics_manager.get_popular_orders(10)
+        if not popular_orders:
+            return None
+
+        items, counts = zip(*popular_orders)
+
+        fig = matplotlib_figure.Figure(figsize=(12, 8))
+        ax = fig.add_subplot()
+        bars = ax.barh(items, counts, color='skyblue')
+        ax.set_xlabel('Количество заказов')
+        ax.set_title('Топ-10 самых популярных заказов')
+        ax.invert_yaxis()
+
+        # Добавляем значения на столбцы
+        for bar, count in zip(bars, counts):
+            ax.text(bar.get_width() + 0.1, bar.get_y() + bar.get_height() / 2,
+                    f'{count}', ha='left', va='center')
+
+        fig.tight_layout()
+        return fig
+
+    def ages_figure(self):
+        """График распределения по возрастам"""
+        age_distribution = self.analytics_manager.get_age_distribution()
+        if age_distribution.empty:
+            return None
+
+        fig = matplotlib_figure.Figure(figsize=(12, 8))
+        ax = fig.add_subplot()
+        ax.bar([str(age) for age in age_distribution.index], age_distribution.to_numpy(),
+               color='lightcoral')
+        ax.set_xlabel('Возраст')
+        ax.set_ylabel('Количество заказов')
+        ax.set_title('Распределение заказов по возрастам')
+        ax.tick_params(axis='x', rotation=45)
+        fig.tight_layout()
+        return fig
+
+    def weekday_figure(self):
+        """График статистики продаж по дням недели"""
+        weekday_sales = self.analytics_manager.get_weekday_sales()
+        if not weekday_sales['Заказы'].any():
+            return None
+
+        fig = matplotlib_figure.Figure(figsize=(12, 10))
+        ax1, ax2 = fig.subplots(2, 1)
+
+        # График выручки по дням
+        ax1.bar(weekday_sales.index, weekday_sales['Выручка'], color='gold')
+        ax1.set_title('Выручка по дням недели')
+        ax1.set_ylabel('Выручка (руб)')
+        ax1.tick_params(axis='x', rotation=45)
+
+        # График количества заказов по дням
+        ax2.bar(weekday_sales.index, weekday_sales['Заказы'], color='lightgreen')
+        ax2.set_title('Количество заказов по дням недели')
+        ax2.set_ylabel('Количество заказов')
+        ax2.tick_params(axis='x', rotation=45)
+
+        fig.tight_layout()
+        return fig
+
+    def hourly_figure(self):
+        """Заказы по часам и тепловая карта день недели x час"""
+        hourly_sales = self.analytics_manager.get_hourly_sales()
+        if not hourly_sales['Заказы'].any():
+            return None
+
+        heatmap = self.analytics_manager.get_sales_heatmap()
+        peak_hours = ', '.join(hour for hour, _ in self.analytics_manager.get_peak_hours())
+
+        fig = matplotlib_figure.Figure(figsize=(12, 10))
+        ax1, ax2 = fig.subplots(2, 1)
+
+        # Заказы по часам
+        ax1.bar(hourly_sales.index, hourly_sales['Заказы'], color='skyblue')
+        ax1.set_title(f'Количество заказов по часам (пик: {peak_hours})')
+        ax1.set_xlabel('Час')
+        ax1.set_ylabel('Количество заказов')
+        ax1.set_xticks(range(24))
+
+        # Тепловая карта
+        image = ax2.imshow(heatmap.to_numpy(), aspect='auto', cmap='YlOrRd')
+        ax2.set_title('Заказы по дням недели и часам')
+        ax2.set_xticks(range(24))
+        ax2.set_yticks(range(7))
+        ax2.set_yticklabels(heatmap.index)
+        ax2.set_xlabel('Час')
+        fig.colorbar(image, ax=ax2, label='Количество заказов')
+
+        fig.tight_layout()
+        return fig
+
+
+class ReceiptTemplate:
+    """Скомпилированный макет PDF-чека.
+
+    Статические части чека (шапка с реквизитами и неизменная часть
+    фискального блока) компилируются один раз на каждую версию настроек
+    чека в список команд рисования. В документе они оформляются как form
+    XObject и повторно используются на каждой странице, а на каждый чек
+    рисуются только позиции и итоги. Длинный чек переносится на следующие
+    страницы.
+    """
+
+    WIDTH, HEIGHT = LETTER
+    LEFT = 100
+    INDENT = 110
+    TOP = HEIGHT - 80
+    BOTTOM = 60
+    QR_X, QR_Y, QR_SIZE = 180, 50, 150
+    FISCAL_HEIGHT = 24  # высота статической части фискального блока
+
+    _compiled = {}
+
+    def __init__(self, receipt_config):
+        self.qr_link = receipt_config['QR']['Ссылка']
+        company_name = receipt_config['Чек']['Название_компании']
+        inn = receipt_config['Чек']['ИНН']
+        address = receipt_config['Чек']['Адрес']
+
+        # Шапка: абсолютные координаты страницы
+        y = self.TOP
+        self.header_ops = [("font", "Helvetica-Bold", 14),
+                           ("centred", self.WIDTH / 2, y, "КАССОВЫЙ ЧЕК")]
+        y -= 30
+        self.header_ops += [("font", "Helvetica-Bold", 11),
+                            ("text", self.LEFT, y, company_name)]
+        y -= 18
+        self.header_ops.append(("font", "Helvetica", 9))
+        for text in (f"ИНН: {inn}", f"Адрес: {address}", "СНО: УСН"):
+            self.header_ops.append(("text", self.LEFT, y, text))
+            y -= 15
+        y -= 10
+        self.header_ops.append(("line", 80, y, self.WIDTH - 80, y))
+        self.body_top = y - 20
+
+        # Фискальный блок: от y=FISCAL_HEIGHT вниз до y=0
+        self.fiscal_ops = [("font", "Helvetica", 8)]
+        y = self.FISCAL_HEIGHT
+        for text in (f"РН ККТ: 0000{inn[:10]}", f"ЗН ККТ: 00000000{inn[:6]}",
+                     f"ФН: 9999{inn[:8]}"):
+            self.fiscal_ops.append(("text", self.LEFT, y, text))
+            y -= 12
+
+    @classmethod
+    def for_config(cls, receipt_config):
+        """Макет для текущих настроек чека (компилируется при их изменении)"""
+        key = tuple((section, tuple(receipt_config[section].items()))
+                    for section in receipt_config.sections())
+        template = cls._compiled.get(key)
+        if template is None:
+            template = cls(receipt_config)
+            cls._compiled = {key: template}
+        return template
+
+    @staticmethod
+    def run_ops(c, ops):
+        for op in ops:
+            if op[0] == "font":
+                c.setFont(op[1], op[2])
+            elif op[0] == "text":
+                c.drawString(op[1], op[2], op[3])
+            elif op[0] == "centred":
+                c.drawCentredString(op[1], op[2], op[3])
+            elif op[0] == "line":
+                c.line(op[1], op[2], op[3], op[4])
+
+    def qr_matrix(self, order, save_to_file=SAVE_QR_FILES):
+        """Матрица модулей QR-кода чека (PNG на диск - только по запросу)"""
+        receipt_id = order.receipt_id
+        qr_data = f"Чек №: {receipt_id}\n"
+        qr_data += f"Сумма: {order.total} руб.\n"
+        qr_data += f"Дата: {order.date_text}\n"
+        qr_data += f"Сайт: {self.qr_link}"
+
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=qrcode.constants.ERROR_CORRECT_L,
+            box_size=10,
+            border=4,
+        )
+        qr.add_data(qr_data)
+        qr.make(fit=True)
+
+        if save_to_file:
+            img = qr.make_image(fill_color="black", back_color="white")
+            if not os.path.exists('qrcodes'):
+                os.makedirs('qrcodes')
+            img.save(f"qrcodes/receipt_{receipt_id}.png")
+
+        return qr.get_matrix()
+
+    @staticmethod
+    def draw_qr_code(c, matrix, x, y, size):
+        """Отрисовка QR-кода векторными модулями прямо на холсте PDF"""
+        module = size / len(matrix)
+        c.saveState()
+        c.setFillColorRGB(0, 0, 0)
+        for row_index, row in enumerate(matrix):
+            row_y = y + size - (row_index + 1) * module
+            col = 0
+            # Соседние темные модули строки рисуются одним прямоугольником
+            while col < len(row):
+                if not row[col]:
+                    col += 1
+                    continue
+                start = col
+                while col < len(row) and row[col]:
+                    col += 1
+                c.rect(x + start * module, row_y, (col - start) * module, module,
+                       stroke=0, fill=1)
+        c.restoreState()
+
+    @staticmethod
+    def pdf_path(order, output_dir="receipts"):
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir, exist_ok=True)
+        return os.path.join(output_dir, f"receipt_{order.receipt_id}.pdf")
+
+    def render(self, order, pdf_path, qr_matrix=None):
+        """Генерация чека в формате PDF по ФЗ-54"""
+        c = canvas.Canvas(pdf_path, pagesize=LETTER)
+
+        c.beginForm("header")
+        self.run_ops(c, self.header_ops)
+        c.endForm()
+        c.beginForm("fiscal", lowery=-5, uppery=self.FISCAL_HEIGHT + 15)
+        self.run_ops(c, self.fiscal_ops)
+        c.endForm()
+
+        c.doForm("header")
+        y = self.body_top
+
+        def need(height):
+            nonlocal y
+            if y - height < self.BOTTOM:
+                c.showPage()
+                c.doForm("header")
+                y = self.body_top
+
+        def text(x, value, step, font=("Helvetica", 8)):
+            nonlocal y
+            need(step)
+            c.setFont(*font)
+            c.drawString(x, y, value)
+            y -= step
+
+        def separator(before=0):
+            nonlocal y
+            y -= before
+            need(20)
+            c.line(80, y, self.WIDTH - 80, y)
+            y -= 20
+
+        # Дата и смена
+        regular = ("Helvetica", 9)
+        text(self.LEFT, f"Дата: {order.date_text}", 15, regular)
+        text(self.LEFT, f"Кассир: {order.fio or 'Администратор'}", 15, regular)
+        text(self.LEFT, "Смена №: 1", 15, regular)
+        text(self.LEFT, f"Чек №: {order.receipt_id}", 25, regular)
+        separator()
+
+        # ТОВАРЫ
+        text(self.LEFT, "ТОВАРЫ:", 18, ("Helvetica-Bold", 10))
+        for line in order.lines:
+            # Позиция целиком на одной странице
+            need(42 + (12 if line.comment else 0))
+            text(self.LEFT, line.title(), 12)
+            if line.comment:
+                text(self.INDENT, f"Комментарий: {line.comment}", 12)
+            text(self.INDENT,
+                 f"{line.quantity} x {line.unit_price}.00 = {line.total}.00", 12)
+            text(self.INDENT, f"НДС 20%: {Cart.line_vat(line)}.00", 18)
+
+        # Общий комментарий если есть
+        if order.comment:
+            y -= 10
+            text(self.LEFT, "Общий комментарий клиента:", 12, ("Helvetica-Bold", 9))
+            # Разбиваем длинный комментарий на строки
+            comment_lines = []
+            current_line = ""
+            for word in order.comment.split():
+                if len(current_line + word) <= 50:
+                    current_line += word + " "
+                else:
+                    comment_lines.append(current_line)
+                    current_line = word + " "
+            if current_line:
+                comment_lines.append(current_line)
+            for comment_line in comment_lines:
+                text(self.LEFT, comment_line, 12)
+
+        separator()
+
+        # ИТОГО
+        need(90)
+        text(self.LEFT, f"ИТОГО: {order.total}.00 руб", 18, ("Helvetica-Bold", 11))
+        text(self.LEFT, f"в т.ч. НДС 20%: {order.vat}.00 руб", 20, regular)
+
+        # Форма оплаты
+        bold = ("Helvetica-Bold", 9)
+        if order.payment_method == "Наличные":
+            text(self.LEFT, f"НАЛИЧНЫМИ: {order.total}.00 руб", 15, bold)
+            if order.change > 0:
+                text(self.LEFT, f"Сдача: {order.change}.00 руб", 15, bold)
+        else:
+            text(self.LEFT, f"БЕЗНАЛИЧНЫМИ: {order.total}.00 руб", 15, bold)
+
+        separator(before=10)
+
+        # Фискальная информация
+        need(self.FISCAL_HEIGHT + 44)
+        c.saveState()
+        c.translate(0, y - self.FISCAL_HEIGHT)
+        c.doForm("fiscal")
+        c.restoreState()
+        y -= self.FISCAL_HEIGHT + 12
+        receipt_id = order.receipt_id
+        text(self.LEFT, f"ФД: {receipt_id}", 12)
+        fiscal_sign = int(receipt_id[-8:]) if len(receipt_id) >= 8 else int(receipt_id)
+        text(self.LEFT, f"ФП: {fiscal_sign}", 20)
+
+        # QR-код внизу страницы, под последней строкой
+        if qr_matrix:
+            need(self.QR_SIZE)
+            self.draw_qr_code(c, qr_matrix, self.QR_X, self.QR_Y, self.QR_SIZE)
+
+        c.save()
+        return pdf_path
+
+
+class ReceiptPipeline:
+    """Фоновая обработка оформленных заказов.
+
+    Задачи (сохранение заказа, списание остатков, QR и PDF) выполняются в
+    пуле потоков; результаты попадают в очередь, которую главный поток Tk
+    опрашивает через after(), поэтому обратные вызовы безопасно трогают
+    виджеты.
+    """
+
+    POLL_MS = 50
+
+    def __init__(self, root, max_workers=4):
+        self.root = root
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="receipt")
+        self.results = queue.Queue()
+        self.pending = 0
+        self._polling = False
+
+    def submit(self, fn, *args, on_done=None):
+        """Запуск задачи; on_done(result, error) вызывается в потоке Tk"""
+
+        def run():
+            try:
+                self.results.put((on_done, fn(*args), None))
+            except Exception as e:
+                self.results.put((on_done, None, e))
+
+        self.pending += 1
+        self.executor.submit(run)
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.POLL_MS, self._poll)
+
+    def _poll(self):
+        while True:
+            try:
+                on_done, result, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending -= 1
+            if on_done is not None:
+                try:
+                    on_done(result, error)
+                except Exception as e:
+                    print(f"Ошибка обработки результата задачи: {e}")
+        if self.pending:
+            self.root.after(self.POLL_MS, self._poll)
+        else:
+            self._polling = False
 
-    def __init__(self, data_manager):
-        self.data_manager = data_manager
+    def shutdown(self):
+        """Ожидание незавершенных задач перед выходом"""
+        self.executor.shutdown(wait=True)
 
-    def load_orders_data(self):
-        """Загрузка данных о заказах"""
-        return self.data_manager.load_orders()
 
-    def get_popular_orders(self, top_n=10):
-        """Получение самых популярных заказов"""
-        df = self.load_orders_data()
-        if df.empty:
-            return []
+class MenuRow(ctk.CTkFrame):
+    """Строка меню (пицца или напиток).
 
-        all_orders = []
-        for orders in df['Заказ']:
-            if pd.notna(orders):
-                items = str(orders).split('; ')
-                all_orders.extend(items)
+    Виджеты создаются один раз; bind() подставляет в них позицию меню,
+    поэтому смена клиента или меню не пересоздает дерево виджетов.
+    """
 
-        order_counts = Counter(all_orders)
-        return order_counts.most_common(top_n)
+    def __init__(self, parent, app, kind):
+        super().__init__(parent)
+        self.app = app
+        self.kind = kind  # "pizza" или "drink"
+        self.name = None
+        self.audience = None
+        self.bound = None  # (название, аудитория, поколение конфигов)
 
-    def get_age_distribution(self):
-        """Получение распределения по возрастам"""
-        df = self.load_orders_data()
-        if df.empty:
-            return pd.Series()
+        # Верхняя часть: изображение и информация
+        top_frame = ctk.CTkFrame(self)
+        top_frame.pack(fill="x", pady=5)
 
-        return df['Возраст'].value_counts().sort_index()
+        self.image_label = ctk.CTkLabel(top_frame, text="")
+        self.image_label.pack(side="left", padx=10)
 
-    def get_sales_statistics(self):
-        """Получение статистики продаж"""
-        df = self.load_orders_data()
-        if df.empty:
-            return {
-                'total_orders': 0,
-                'total_revenue': 0,
-                'avg_order_value': 0,
-                'most_popular_time': 'Нет данных'
-            }
+        info_frame = ctk.CTkFrame(top_frame)
+        info_frame.pack(side="left", fill="x", expand=True, padx=10)
 
-        total_orders = len(df)
-        total_revenue = df['Сумма'].sum()
-        avg_order_value = df['Сумма'].mean()
+        self.title_label = ctk.CTkLabel(info_frame, text="",
+                                        font=ctk.CTkFont(size=14, weight="bold"))
+        self.title_label.pack(anchor="w")
 
-        return {
-            'total_orders': total_orders,
-            'total_revenue': total_revenue,
-            'avg_order_value': avg_order_value,
-            'most_popular_time': '12:00'
-        }
+        if kind == "pizza":
+            self.ingredients_label = ctk.CTkLabel(info_frame, text="",
+                                                  font=ctk.CTkFont(size=12),
+                                                  text_color="gray")
+            self.ingredients_label.pack(anchor="w")
+
+            # Нижняя часть: выбор размера и кнопки
+            bottom_frame = ctk.CTkFrame(self)
+            bottom_frame.pack(fill="x", pady=5)
+            variant_frame = ctk.CTkFrame(bottom_frame)
+            variant_frame.pack(side="left", padx=10)
+            button_frame = ctk.CTkFrame(bottom_frame)
+            button_frame.pack(side="right", padx=10)
+            variant_title, variant_width = "Размер:", 120
+        else:
+            # Выбор объема с отображением скидки
+            variant_frame = ctk.CTkFrame(info_frame)
+            variant_frame.pack(anchor="w", pady=5)
+            button_frame = ctk.CTkFrame(self)
+            button_frame.pack(anchor="e", pady=5)
+            variant_title, variant_width = "Объем:", 100
+
+        ctk.CTkLabel(variant_frame, text=variant_title,
+                     font=ctk.CTkFont(size=12)).pack(side="left", padx=5)
+        self.variant_var = ctk.StringVar()
+        self.variant_menu = ctk.CTkOptionMenu(variant_frame, variable=self.variant_var,
+                                              values=[""], width=variant_width)
+        self.variant_menu.pack(side="left", padx=5)
+
+        # Отображение цены с учетом размера или скидки
+        self.price_label = ctk.CTkLabel(variant_frame, text="",
+                                        font=ctk.CTkFont(size=12, weight="bold"))
+        self.price_label.pack(side="left", padx=10)
+        self.variant_var.trace_add('write', lambda *args: self.update_price())
+
+        # Кнопка комментария для позиции
+        ctk.CTkButton(button_frame,
+                      text="💬",
+                      command=lambda: self.app.add_item_comment_dialog(self.name),
+                      width=40,
+                      height=30,
+                      fg_color="orange",
+                      hover_color="#cc5500").pack(side="left", padx=2)
+
+        ctk.CTkButton(button_frame,
+                      text="Добавить",
+                      command=self.add_to_cart,
+                      width=100).pack(side="left", padx=2)
+
+        self.custom_btn = None
+        if kind == "pizza":
+            self.custom_btn = ctk.CTkButton(button_frame,
+                                            text="Создать свою",
+                                            command=self.app.create_custom_pizza_dialog,
+                                            width=100,
+                                            fg_color="green",
+                                            hover_color="#006400")
+
+    def bind(self, name, info, audience):
+        """Подстановка позиции меню в готовые виджеты"""
+        app = self.app
+        prices = app.prices
+        self.name = None  # цена не пересчитывается, пока строка не заполнена
+        self.audience = audience
+
+        if self.kind == "pizza":
+            category = "Пиццы"
+            self.title_label.configure(text=f"{name} - {info['цена']} руб. ({info['размер']})")
+            self.ingredients_label.configure(text=info['ингредиенты'])
+            self.variant_menu.configure(values=list(prices.sizes[audience]))
+            variant = prices.default_sizes[(audience, name)]
+            if name.casefold() == "кастомная":
+                self.custom_btn.pack(side="left", padx=2)
+            else:
+                self.custom_btn.pack_forget()
+        else:
+            category = "Напитки"
+            self.title_label.configure(text=f"{name} - {info['цена']} руб. ({info['объем']})")
+            self.variant_menu.configure(
+                values=[prices.volume_labels[volume] for volume in prices.volumes])
+            variant = prices.volume_labels.get(info['объем'], info['объем'])
+
+        image_path = app.images_config[category].get(name, "")
+        self.image_label.configure(image=app.image_manager.load_image(
+            image_path, size=ImageManager.MENU_SIZES[category]))
+
+        self.variant_var.set(variant)
+        self.name = name
+        self.update_price()
+
+    def variant(self):
+        if self.kind == "pizza":
+            return self.variant_var.get()
+        return self.app.volume_of(self.variant_var)
+
+    def update_price(self):
+        if self.name is None:
+            return
+        price, _ = self.app.prices.price(self.audience, self.kind, self.name, self.variant())
+        self.price_label.configure(text=f"{price} руб.")
+
+    def add_to_cart(self):
+        if self.kind == "pizza":
+            self.app.add_pizza_with_size(self.name, self.variant_var)
+        else:
+            self.app.add_drink_with_volume(self.name, self.variant_var)
+
+
+class MenuListView(ctk.CTkFrame):
+    """Виртуализированный список строк меню одной категории.
+
+    Виджеты создаются только для видимых строк (сколько помещается по
+    высоте); при прокрутке те же MenuRow получают другие позиции через
+    bind(). Время отрисовки не зависит от длины меню.
+    """
+
+    ROW_HEIGHTS = {"pizza": 170, "drink": 140}  # примерная высота строки, px
+
+    def __init__(self, parent, app, kind):
+        super().__init__(parent, fg_color="transparent")
+        self.app = app
+        self.kind = kind
+        self.row_height = self.ROW_HEIGHTS[kind]
+        self.items = []  # [(название, описание)]
+        self.audience = None
+        self.generation = None  # поколение конфигов последней отрисовки
+        self.offset = 0
+        self.visible = 1
+        self.rows = []
+
+        # Листание страниц
+        page_frame = ctk.CTkFrame(self, fg_color="transparent")
+        page_frame.pack(side="bottom", fill="x", pady=(5, 0))
+        ctk.CTkButton(page_frame, text="◀", width=40,
+                      command=lambda: self.scroll(-self.visible)).pack(side="left", padx=5)
+        self.page_label = ctk.CTkLabel(page_frame, text="")
+        self.page_label.pack(side="left", expand=True)
+        ctk.CTkButton(page_frame, text="▶", width=40,
+                      command=lambda: self.scroll(self.visible)).pack(side="right", padx=5)
+
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.rows_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.rows_frame.pack(side="left", fill="both", expand=True)
+        self.rows_frame.bind("<Configure>", self.on_resize)
+
+        # Колесо мыши: событие доходит до окна, прокручивается список под курсором
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.winfo_toplevel().bind(sequence, self.on_wheel, add="+")
+
+    def set_items(self, items, audience):
+        """Новый список позиций; прокрутка возвращается в начало.
+
+        Строки, уже показывающие нужную позицию, не перепривязываются:
+        ключ привязки учитывает аудиторию и поколение конфигов. После
+        сохранения настроек список перерисовывается, даже если позиции
+        те же: цены и подписи объемов могли измениться.
+        """
+        items = list(items)
+        if (items == self.items and audience == self.audience and self.offset == 0
+                and self.generation == self.app.config_manager.generation):
+            return
+        self.items = items
+        self.audience = audience
+        self.offset = 0
+        self.render()
+
+    def on_resize(self, event):
+        visible = max(1, event.height // self.row_height)
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+
+    def on_wheel(self, event):
+        try:
+            widget = self.winfo_containing(event.x_root, event.y_root)
+        except KeyError:  # всплывающие окна option menu
+            return
+        if widget is None or not f"{widget}.".startswith(f"{self}."):
+            return
+        if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+            self.scroll(-1)
+        else:
+            self.scroll(1)
+
+    def on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self.scroll_to(round(float(value) * len(self.items)))
+        elif action == "scroll":
+            step = self.visible if unit == "pages" else 1
+            self.scroll(int(value) * step)
+
+    def scroll(self, rows):
+        self.scroll_to(self.offset + rows)
+
+    def scroll_to(self, offset):
+        offset = max(0, min(offset, len(self.items) - self.visible))
+        if offset != self.offset:
+            self.offset = offset
+            self.render()
+
+    def render(self):
+        """Привязка видимого окна списка к пулу строк"""
+        self.offset = max(0, min(self.offset, len(self.items) - self.visible))
+        shown = self.items[self.offset:self.offset + self.visible]
+        while len(self.rows) < len(shown):
+            self.rows.append(MenuRow(self.rows_frame, self.app, self.kind))
+
+        generation = self.generation = self.app.config_manager.generation
+        for row, (name, info) in zip(self.rows, shown):
+            key = (name, self.audience, generation)
+            if row.bound != key:
+                row.bind(name, info, self.audience)
+                row.bound = key
+            if not row.winfo_manager():
+                row.pack(pady=5, padx=10, fill="x")
+        for row in self.rows[len(shown):]:
+            row.pack_forget()
+
+        total = len(self.items)
+        if total:
+            self.scrollbar.set(self.offset / total,
+                               min(1.0, (self.offset + self.visible) / total))
+            pages = (total + self.visible - 1) // self.visible
+            page = min(pages, self.offset // self.visible + 1)
+            self.page_label.configure(text=f"{page} / {pages}  ({total} поз.)")
+        else:
+            self.scrollbar.set(0.0, 1.0)
+            self.page_label.configure(text="Нет позиций")
 
 
 class PizzaMakerApp(ctk.CTk):
 
-    def __init__(self):
+    RECEIPT_JOB_TITLES = {
+        "order": "Заказ сохранен",
+        "stock": "Остатки обновлены",
+        "pdf": "PDF чек"
+    }
+
+    def __init__(self, exit_after_first_frame=False):
         super().__init__()
+        self.exit_after_first_frame = exit_after_first_frame
 
         self.title("Pizza Maker 🍕")
         self.geometry("1200x800")
@@ -548,20 +3334,74 @@ class PizzaMakerApp(ctk.CTk):
 
         # Инициализация менеджеров
         self.data_manager = DataManager()
+        self.data_manager.load_inventory_cache()
+        self.data_manager.load_analytics()
         self.config_manager = ConfigManager()
         self.image_manager = ImageManager()
         self.analytics_manager = AnalyticsManager(self.data_manager)
+        self.analytics_report = AnalyticsReport(self.analytics_manager)
+        self.receipt_pipeline = ReceiptPipeline(self)
+        self.receipt_files = {}
 
         # Загрузка конфигурации
         self.load_configuration()
+        self.image_manager.prewarm(self.images_config)
 
         # Данные пользователя
         self.user_data = {}
-        self.current_order = []
-        self.total_amount = 0
+        self.cart = Cart()
+        self._cart_tags = {}
         self.user_comment = ""
 
+        # Экраны строятся один раз и дальше только показываются
+        self.screens = {}
+        self.current_screen = None
+        self._menu_key = None
+
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.after(ORDERS_EXPORT_INTERVAL_MS, self.schedule_orders_export)
+
         self.create_welcome_frame()
+        # Выполнится после отрисовки окна (перерисовка Tk - тоже idle-задача)
+        self.after_idle(self.on_first_frame)
+
+    def on_first_frame(self):
+        """Первое окно на экране: тяжелые модули подгружаются в фоне"""
+        first_frame_ms = (time.perf_counter() - _STARTED) * 1000
+        if self.exit_after_first_frame:
+            print(f"first_frame_ms={first_frame_ms:.1f}")
+            # Замер запуска не должен перезаписывать выгрузку в Excel
+            self.on_close(export=False)
+            return
+        threading.Thread(target=self.prewarm_imports, daemon=True).start()
+
+    @staticmethod
+    def prewarm_imports():
+        for module in PREWARM_MODULES:
+            try:
+                module._import()
+            except Exception as e:
+                print(f"Ошибка предзагрузки модуля {module._name}: {e}")
+
+    def schedule_orders_export(self):
+        """Периодические фоновые задачи: выгрузка в Excel, архивация
+        закрытых дней и обновление отчета аналитики"""
+        threading.Thread(target=self.run_background_jobs, daemon=True).start()
+        self.after(ORDERS_EXPORT_INTERVAL_MS, self.schedule_orders_export)
+
+    def run_background_jobs(self):
+        self.data_manager.export_to_excel()
+        self.data_manager.archive_orders()
+        try:
+            self.analytics_report.render()
+        except Exception as e:
+            print(f"Ошибка построения отчета аналитики: {e}")
+
+    def on_close(self, export=True):
+        """Завершение работы с сохранением данных"""
+        self.receipt_pipeline.shutdown()
+        self.data_manager.close(export=export)
+        self.quit()
 
     def load_configuration(self):
         """Загрузка всей конфигурации"""
@@ -572,24 +3412,66 @@ class PizzaMakerApp(ctk.CTk):
             self.menu_adult = self.config_manager.load_menu_config('menu_adult.txt')
             self.menu_minor = self.config_manager.load_menu_config('menu_minor.txt')
             self.toppings = self.config_manager.load_toppings()
+            recipes = self.config_manager.load_recipes()
+            products = self.data_manager.inventory_products()
+
+            # Таблица списаний пересобирается, только если что-то изменилось
+            recipes_key = (self.config_manager.generation, tuple(products))
+            if getattr(self, "_recipes_key", None) != recipes_key:
+                self.recipes = RecipeBook(
+                    recipes, [self.menu_adult, self.menu_minor], self.toppings,
+                    products)
+                self._recipes_key = recipes_key
+
+            prices_key = self.config_manager.generation
+            if getattr(self, "_prices_key", None) != prices_key:
+                self.prices = PriceTable(
+                    [self.menu_adult, self.menu_minor], self.discounts_config,
+                    self.toppings)
+                self._prices_key = prices_key
+                self.reprice_cart()
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка загрузки конфигурации: {e}")
 
-    def clear_frame(self):
-        for widget in self.winfo_children():
-            widget.destroy()
+    def reprice_cart(self):
+        """Цены в корзине - по текущей таблице цен"""
+        if not getattr(self, "cart", None) or not self.user_data:
+            return
+        audience = PriceTable.audience(self.user_data["age"] >= 18)
+        self.cart.reprice(lambda line: self.prices.reprice(audience, line))
+        cart_textbox = getattr(self, "cart_textbox", None)
+        if cart_textbox is not None and cart_textbox.winfo_exists():
+            self.update_cart_display()
+
+    def show_screen(self, name):
+        """Показ экрана; экран строится при первом показе и дальше
+        переиспользуется"""
+        screen = self.screens.get(name)
+        if screen is None:
+            screen = ctk.CTkFrame(self, fg_color="transparent")
+            getattr(self, f"build_{name}_screen")(screen)
+            self.screens[name] = screen
+        if self.current_screen is not screen:
+            if self.current_screen is not None:
+                self.current_screen.pack_forget()
+            screen.pack(fill="both", expand=True)
+            self.current_screen = screen
+        return screen
 
     def create_welcome_frame(self):
-        self.clear_frame()
+        self.show_screen("welcome")
+        self.fio_entry.delete(0, "end")
+        self.age_entry.delete(0, "end")
 
+    def build_welcome_screen(self, screen):
         # Заголовок
-        title_label = ctk.CTkLabel(self,
+        title_label = ctk.CTkLabel(screen,
                                    text="🍕 Pizza Maker",
                                    font=ctk.CTkFont(size=28, weight="bold"))
         title_label.pack(pady=40)
 
         # Фрейм для ввода данных
-        input_frame = ctk.CTkFrame(self)
+        input_frame = ctk.CTkFrame(screen)
         input_frame.pack(pady=20, padx=50, fill="both", expand=True)
 
         ctk.CTkLabel(input_frame,
@@ -657,12 +3539,10 @@ class PizzaMakerApp(ctk.CTk):
         self.create_menu_frame()
 
     def create_menu_frame(self):
-        self.clear_frame()
+        self.show_screen("menu")
 
         is_adult = self.user_data["age"] >= 18
-        menu = self.menu_adult if is_adult else self.menu_minor
-        pizza_discounts = self.discounts_config["пиццы_взрослые"] if is_adult else self.discounts_config[
-            "пиццы_детские"]
+        audience = PriceTable.audience(is_adult)
 
         # Заголовок
         welcome_text = f"Здравствуйте, {self.user_data['fio']}!"
@@ -670,14 +3550,41 @@ class PizzaMakerApp(ctk.CTk):
             welcome_text += " Вам доступно взрослое меню 🍕"
         else:
             welcome_text += " Добро пожаловать! 🍕"
+        self.menu_title_label.configure(text=welcome_text)
 
-        title_label = ctk.CTkLabel(self,
-                                   text=welcome_text,
-                                   font=ctk.CTkFont(size=20, weight="bold"))
-        title_label.pack(pady=20)
+        # Строки меню перепривязываются, только если сменились меню или цены
+        menu_key = (audience, self.config_manager.generation)
+        if self._menu_key != menu_key:
+            self._menu_key = menu_key
+            self.filter_menu()
+
+        self.comment_label.configure(
+            text=f"Комментарий: {self.user_comment}" if self.user_comment else "")
+        self.update_cart_display()
+
+    def filter_menu(self):
+        """Позиции меню, подходящие под строку поиска (на каждое нажатие)"""
+        if not self.user_data:
+            return
+        is_adult = self.user_data["age"] >= 18
+        menu = self.menu_adult if is_adult else self.menu_minor
+        menu_file = 'menu_adult.txt' if is_adult else 'menu_minor.txt'
+        audience = PriceTable.audience(is_adult)
+
+        found = self.config_manager.search_index(menu_file).search(self.search_var.get())
+        for category, view in self.menu_lists.items():
+            view.set_items([(name, menu[category][name]) for name in found[category]],
+                           audience)
+
+    def build_menu_screen(self, screen):
+        # Заголовок
+        self.menu_title_label = ctk.CTkLabel(screen,
+                                             text="",
+                                             font=ctk.CTkFont(size=20, weight="bold"))
+        self.menu_title_label.pack(pady=20)
 
         # Основной фрейм
-        main_frame = ctk.CTkFrame(self)
+        main_frame = ctk.CTkFrame(screen)
         main_frame.pack(pady=20, padx=20, fill="both", expand=True)
 
         # Фрейм меню
@@ -692,181 +3599,31 @@ class PizzaMakerApp(ctk.CTk):
         cart_frame = ctk.CTkFrame(main_frame, width=300)
         cart_frame.pack(side="right", padx=10, pady=10, fill="y")
 
+        # Поиск по названию и составу
+        search_frame = ctk.CTkFrame(menu_frame)
+        search_frame.pack(pady=(10, 0), padx=10, fill="x")
+
+        ctk.CTkLabel(search_frame, text="🔍 Поиск (название или состав):",
+                     font=ctk.CTkFont(size=12)).pack(side="left", padx=5)
+        # У поля с textvariable нет placeholder в customtkinter, поэтому подпись слева
+        self.search_var = ctk.StringVar()
+        search_entry = ctk.CTkEntry(search_frame,
+                                    textvariable=self.search_var,
+                                    height=35)
+        search_entry.pack(side="left", padx=5, pady=5, fill="x", expand=True)
+        self.search_var.trace_add('write', lambda *args: self.filter_menu())
+
         # Вкладки
         tabview = ctk.CTkTabview(menu_frame)
         tabview.pack(pady=10, padx=10, fill="both", expand=True)
 
-        tab_pizzas = tabview.add("🍕 Пиццы")
-        tab_drinks = tabview.add("🥤 Напитки")
-
-        # Отображение пицц с изображениями и выбором размера
-        for pizza, info in menu["Пиццы"].items():
-            pizza_frame = ctk.CTkFrame(tab_pizzas)
-            pizza_frame.pack(pady=10, padx=10, fill="x")
-
-            # Верхняя часть: изображение и информация
-            top_frame = ctk.CTkFrame(pizza_frame)
-            top_frame.pack(fill="x", pady=5)
-
-            # Изображение пиццы
-            image_path = self.images_config["Пиццы"].get(pizza, "")
-            pizza_image = self.image_manager.load_image(image_path, size=(120, 90))
-
-            image_label = ctk.CTkLabel(top_frame, image=pizza_image, text="")
-            image_label.pack(side="left", padx=10)
-
-            # Информация о пицце
-            info_frame = ctk.CTkFrame(top_frame)
-            info_frame.pack(side="left", fill="x", expand=True, padx=10)
-
-            pizza_text = f"{pizza} - {info['цена']} руб. ({info['размер']})"
-            ctk.CTkLabel(info_frame,
-                         text=pizza_text,
-                         font=ctk.CTkFont(size=14, weight="bold")).pack(anchor="w")
-
-            ctk.CTkLabel(info_frame,
-                         text=info['ингредиенты'],
-                         font=ctk.CTkFont(size=12),
-                         text_color="gray").pack(anchor="w")
-
-            # Нижняя часть: выбор размера и кнопки
-            bottom_frame = ctk.CTkFrame(pizza_frame)
-            bottom_frame.pack(fill="x", pady=5)
-
-            # Выбор размера
-            size_frame = ctk.CTkFrame(bottom_frame)
-            size_frame.pack(side="left", padx=10)
-
-            ctk.CTkLabel(size_frame, text="Размер:", font=ctk.CTkFont(size=12)).pack(side="left", padx=5)
-            size_var = ctk.StringVar(value=info['размер'])
-
-            size_options = list(pizza_discounts.keys())
-            size_menu = ctk.CTkOptionMenu(size_frame, variable=size_var, values=size_options, width=120)
-            size_menu.pack(side="left", padx=5)
-
-            # Отображение цены с учетом размера
-            price_label = ctk.CTkLabel(size_frame, text="", font=ctk.CTkFont(size=12, weight="bold"))
-            price_label.pack(side="left", padx=10)
-
-            def update_price(p=info['цена'], s=size_var, l=price_label, d=pizza_discounts):
-                size = s.get()
-                multiplier = d.get(size, 1.0)
-                new_price = int(p * multiplier)
-                l.configure(text=f"{new_price} руб.")
-
-            size_var.trace('w', lambda *args: update_price())
-            update_price()  # Initial update
-
-            # Кнопки
-            button_frame = ctk.CTkFrame(bottom_frame)
-            button_frame.pack(side="right", padx=10)
-
-            # Кнопка комментария для конкретной пиццы
-            comment_btn = ctk.CTkButton(button_frame,
-                                        text="💬",
-                                        command=lambda p=pizza: self.add_item_comment_dialog(p),
-                                        width=40,
-                                        height=30,
-                                        fg_color="orange",
-                                        hover_color="#cc5500")
-            comment_btn.pack(side="left", padx=2)
-
-            add_btn = ctk.CTkButton(button_frame,
-                                    text="Добавить",
-                                    command=lambda p=pizza, sz=size_var, base=info['цена'], d=pizza_discounts:
-                                    self.add_pizza_with_size(p, sz, base, d),
-                                    width=100)
-            add_btn.pack(side="left", padx=2)
-
-            if pizza == "Кастомная":
-                custom_btn = ctk.CTkButton(
-                    button_frame,
-                    text="Создать свою",
-                    command=self.create_custom_pizza_dialog,
-                    width=100,
-                    fg_color="green",
-                    hover_color="#006400")
-                custom_btn.pack(side="left", padx=2)
-
-        # Отображение напитков с выбором объема и учетом скидок
-        for drink, info in menu["Напитки"].items():
-            drink_frame = ctk.CTkFrame(tab_drinks)
-            drink_frame.pack(pady=10, padx=10, fill="x")
-
-            # Верхняя часть: изображение и информация
-            top_frame = ctk.CTkFrame(drink_frame)
-            top_frame.pack(fill="x", pady=5)
-
-            # Изображение напитка
-            image_path = self.images_config["Напитки"].get(drink, "")
-            drink_image = self.image_manager.load_image(image_path, size=(80, 80))
-
-            image_label = ctk.CTkLabel(top_frame, image=drink_image, text="")
-            image_label.pack(side="left", padx=10)
-
-            # Информация о напитке
-            info_frame = ctk.CTkFrame(top_frame)
-            info_frame.pack(side="left", fill="x", expand=True, padx=10)
-
-            drink_text = f"{drink} - {info['цена']} руб. ({info['объем']})"
-            ctk.CTkLabel(info_frame,
-                         text=drink_text,
-                         font=ctk.CTkFont(size=14, weight="bold")).pack(anchor="w")
-
-            # Выбор объема с отображением скидки
-            volume_frame = ctk.CTkFrame(info_frame)
-            volume_frame.pack(anchor="w", pady=5)
-
-            ctk.CTkLabel(volume_frame, text="Объем:", font=ctk.CTkFont(size=12)).pack(side="left", padx=5)
-            volume_var = ctk.StringVar(value=info['объем'])
-
-            # Создаем опции с отображением скидки
-            volume_options = []
-            for volume in ["0.33л", "0.5л", "1л", "1.5л", "2л"]:
-                discount = self.discounts_config["напитки"].get(volume, 0.0)
-                if discount > 0:
-                    volume_options.append(f"{volume} (-{discount}%)")
-                else:
-                    volume_options.append(volume)
-
-            volume_menu = ctk.CTkOptionMenu(volume_frame, variable=volume_var, values=volume_options, width=100)
-            volume_menu.pack(side="left", padx=5)
-
-            # Отображение цены с учетом скидки
-            drink_price_label = ctk.CTkLabel(volume_frame, text="", font=ctk.CTkFont(size=12, weight="bold"))
-            drink_price_label.pack(side="left", padx=10)
-
-            def update_drink_price(p=info['цена'], v=volume_var, l=drink_price_label,
-                                   d=self.discounts_config["напитки"]):
-                volume_text = v.get()
-                volume = volume_text.split(' ')[0]  # Извлекаем чистый объем
-                discount = d.get(volume, 0.0)
-                final_price = int(p * (1 - discount / 100))
-                l.configure(text=f"{final_price} руб.")
-
-            volume_var.trace('w', lambda *args: update_drink_price())
-            update_drink_price()  # Initial update
-
-            # Кнопки для напитков
-            drink_button_frame = ctk.CTkFrame(drink_frame)
-            drink_button_frame.pack(anchor="e", pady=5)
-
-            # Кнопка комментария для напитка
-            drink_comment_btn = ctk.CTkButton(drink_button_frame,
-                                              text="💬",
-                                              command=lambda d=drink: self.add_item_comment_dialog(d),
-                                              width=40,
-                                              height=30,
-                                              fg_color="orange",
-                                              hover_color="#cc5500")
-            drink_comment_btn.pack(side="left", padx=2)
-
-            add_btn = ctk.CTkButton(drink_button_frame,
-                                    text="Добавить",
-                                    command=lambda d=drink, price=info['цена'], vol=volume_var:
-                                    self.add_drink_with_volume(d, price, vol),
-                                    width=100)
-            add_btn.pack(side="left", padx=2)
+        # Каждая вкладка - виртуализированный список с прокруткой и страницами
+        self.menu_lists = {}
+        for category, kind, title in (("Пиццы", "pizza", "🍕 Пиццы"),
+                                      ("Напитки", "drink", "🥤 Напитки")):
+            view = MenuListView(tabview.add(title), self, kind)
+            view.pack(fill="both", expand=True)
+            self.menu_lists[category] = view
 
         # Поле для общего комментария к заказу
         comment_frame = ctk.CTkFrame(menu_frame)
@@ -888,9 +3645,6 @@ class PizzaMakerApp(ctk.CTk):
                                           wraplength=400)
         self.comment_label.pack(pady=5)
 
-        if self.user_comment:
-            self.comment_label.configure(text=f"Комментарий: {self.user_comment}")
-
         # Корзина
         ctk.CTkLabel(cart_frame,
                      text="🛒 Ваш заказ",
@@ -899,11 +3653,10 @@ class PizzaMakerApp(ctk.CTk):
         self.cart_textbox = ctk.CTkTextbox(cart_frame, height=300, width=280)
         self.cart_textbox.pack(pady=10, padx=10, fill="both", expand=True)
 
-        self.update_cart_display()
-
-        ctk.CTkLabel(cart_frame,
-                     text=f"Итого: {self.total_amount} руб.",
-                     font=ctk.CTkFont(size=16, weight="bold")).pack(pady=5)
+        self.total_label = ctk.CTkLabel(cart_frame,
+                                        text="",
+                                        font=ctk.CTkFont(size=16, weight="bold"))
+        self.total_label.pack(pady=5)
 
         checkout_btn = ctk.CTkButton(cart_frame,
                                      text="Оформить заказ",
@@ -935,11 +3688,8 @@ class PizzaMakerApp(ctk.CTk):
         comment_text.pack(pady=10, padx=20, fill="both", expand=True)
 
         # Проверяем, есть ли уже комментарий для этого товара
-        existing_comment = ""
-        for order_item in self.current_order:
-            if order_item['item'].startswith(item_name) and 'comment' in order_item:
-                existing_comment = order_item['comment']
-                break
+        line = self.cart.find(item_name)
+        existing_comment = line.comment if line is not None else ""
 
         comment_text.insert("1.0", existing_comment)
 
@@ -947,22 +3697,9 @@ class PizzaMakerApp(ctk.CTk):
             comment = comment_text.get("1.0", "end-1c").strip()
 
             # Находим товар в заказе и добавляем комментарий
-            for order_item in self.current_order:
-                if order_item['item'].startswith(item_name):
-                    if comment:
-                        order_item['comment'] = comment
-                        # Обновляем отображение в корзине
-                        order_item['item'] = f"{item_name.split('(')[0].strip()} ({order_item['item'].split('(')[1]} 💬"
-                    else:
-                        # Удаляем комментарий если пустой
-                        if 'comment' in order_item:
-                            del order_item['comment']
-                        # Возвращаем оригинальное название
-                        if '💬' in order_item['item']:
-                            order_item['item'] = order_item['item'].replace('💬', '').strip()
-
-                    self.update_cart_display()
-                    break
+            if line is not None:
+                self.cart.update(Cart.key(line), comment=comment)
+                self.refresh_cart_line(line)
 
             dialog.destroy()
             if comment:
@@ -1010,77 +3747,82 @@ class PizzaMakerApp(ctk.CTk):
                       command=save_comment,
                       height=40).pack(pady=10)
 
-    def add_pizza_with_size(self, pizza, size_var, base_price, discounts):
+    def add_pizza_with_size(self, pizza, size_var):
         """Добавление пиццы с выбранным размером"""
-        size = size_var.get()
-        multiplier = discounts.get(size, 1.0)
-        price = int(base_price * multiplier)
-        item_name = f"{pizza} ({size})"
-
-        # Проверяем, есть ли уже эта пицца в заказе с комментарием
-        for order_item in self.current_order:
-            if order_item['item'].startswith(pizza) and 'comment' in order_item:
-                item_name = f"{pizza} ({size}) 💬"
-                order_item['item'] = item_name
-                order_item['price'] = price
-                self.total_amount = sum(item['price'] for item in self.current_order)
-                self.update_cart_display()
-                messagebox.showinfo("Успех", f"{pizza} обновлена в корзине!")
-                return
+        audience = PriceTable.audience(self.user_data["age"] >= 18)
+        line, is_new = self.cart.add(
+            self.prices.line(audience, "pizza", pizza, size_var.get()))
+        self.refresh_cart_line(line, is_new)
+        if is_new:
+            messagebox.showinfo("Успех", f"{line.title()} добавлена в корзину!")
+        else:
+            messagebox.showinfo("Успех", f"{line.title()}: {line.quantity} шт. в корзине")
 
-        # Если пиццы еще нет в заказе, добавляем новую
-        self.current_order.append({"item": item_name, "price": price, "quantity": 1})
-        self.total_amount += price
-        self.update_cart_display()
-        messagebox.showinfo("Успех", f"{item_name} добавлена в корзину!")
+    def volume_of(self, volume_var):
+        """Объем по подписи варианта в списке ("0.5л (-5.0%)" -> "0.5л")"""
+        label = volume_var.get()
+        for volume, volume_label in self.prices.volume_labels.items():
+            if volume_label == label:
+                return volume
+        return label
 
-    def add_drink_with_volume(self, drink, base_price, volume_var):
+    def add_drink_with_volume(self, drink, volume_var):
         """Добавление напитка с выбранным объемом и учетом скидки"""
-        volume_text = volume_var.get()
-        volume = volume_text.split(' ')[0]  # Извлекаем чистый объем
-
-        discount = self.discounts_config["напитки"].get(volume, 0.0)
-        final_price = int(base_price * (1 - discount / 100))
-
-        item_name = f"{drink} ({volume})"
-        if discount > 0:
-            item_name += f" [СКИДКА {discount}%]"
-
-        # Проверяем, есть ли уже этот напиток в заказе с комментарием
-        for order_item in self.current_order:
-            if order_item['item'].startswith(drink) and 'comment' in order_item:
-                item_name = f"{drink} ({volume}) 💬"
-                if discount > 0:
-                    item_name += f" [СКИДКА {discount}%]"
-                order_item['item'] = item_name
-                order_item['price'] = final_price
-                self.total_amount = sum(item['price'] for item in self.current_order)
-                self.update_cart_display()
-                messagebox.showinfo("Успех", f"{drink} обновлен в корзине!")
-                return
-
-        # Если напитка еще нет в заказе, добавляем новый
-        self.current_order.append({"item": item_name, "price": final_price, "quantity": 1})
-        self.total_amount += final_price
-        self.update_cart_display()
-        messagebox.showinfo("Успех", f"{item_name} добавлен в корзину!")
+        audience = PriceTable.audience(self.user_data["age"] >= 18)
+        line, is_new = self.cart.add(
+            self.prices.line(audience, "drink", drink, self.volume_of(volume_var)))
+        self.refresh_cart_line(line, is_new)
+        if is_new:
+            messagebox.showinfo("Успех", f"{line.title()} добавлен в корзину!")
+        else:
+            messagebox.showinfo("Успех", f"{line.title()}: {line.quantity} шт. в корзине")
+
+    def format_cart_line(self, index, line):
+        item_text = f"{index}. {line.display_name()} - {line.total} руб."
+        if line.quantity > 1:
+            item_text = (f"{index}. {line.display_name()} x{line.quantity} - "
+                         f"{line.total} руб.")
+        # Добавляем комментарий если есть
+        if line.comment:
+            item_text += f"\n   💬 {line.comment}"
+        return item_text + "\n\n"
 
     def update_cart_display(self):
+        """Полная перерисовка корзины"""
         self.cart_textbox.delete("1.0", "end")
-        if not self.current_order:
+        for tag, _ in self._cart_tags.values():
+            self.cart_textbox.tag_delete(tag)
+        self._cart_tags = {}
+        self.total_label.configure(text=f"Итого: {self.cart.total} руб.")
+        if not len(self.cart):
             self.cart_textbox.insert("1.0", "Корзина пуста")
             return
 
-        for i, order_item in enumerate(self.current_order, 1):
-            item_text = f"{i}. {order_item['item']} - {order_item['price']} руб."
-            # Добавляем комментарий если есть
-            if 'comment' in order_item:
-                item_text += f"\n   💬 {order_item['comment']}"
-            self.cart_textbox.insert("end", item_text + "\n\n")
+        for i, line in enumerate(self.cart, 1):
+            tag = f"cart_line_{i}"
+            self._cart_tags[Cart.key(line)] = (tag, i)
+            self.cart_textbox.insert("end", self.format_cart_line(i, line), tag)
+
+    def refresh_cart_line(self, line, is_new=False):
+        """Перерисовка одной строки корзины без перерисовки остальных"""
+        self.total_label.configure(text=f"Итого: {self.cart.total} руб.")
+        key = Cart.key(line)
+        if is_new:
+            if len(self.cart) == 1:
+                self.cart_textbox.delete("1.0", "end")  # "Корзина пуста"
+            index = len(self.cart)
+            tag = f"cart_line_{index}"
+            self._cart_tags[key] = (tag, index)
+            self.cart_textbox.insert("end", self.format_cart_line(index, line), tag)
+            return
+
+        tag, index = self._cart_tags[key]
+        start, end = self.cart_textbox.tag_ranges(tag)[:2]
+        self.cart_textbox.delete(start, end)
+        self.cart_textbox.insert(start, self.format_cart_line(index, line), tag)
 
     def clear_cart(self):
-        self.current_order = []
-        self.total_amount = 0
+        self.cart.clear()
         self.user_comment = ""
         self.comment_label.configure(text="")
         self.update_cart_display()
@@ -1091,15 +3833,15 @@ class PizzaMakerApp(ctk.CTk):
         dialog.geometry("500x600")
         dialog.resizable(False, False)
 
-        is_adult = self.user_data["age"] >= 18
-        base_price = 400 if is_adult else 300
+        audience = PriceTable.audience(self.user_data["age"] >= 18)
+        prices = self.prices
         selected_toppings = []
-        current_price = base_price
+        current_price = prices.custom_price(audience, ())
 
-        def update_price():
+        def update_price(topping, selected):
+            # Цена меняется на стоимость одной начинки, без пересчета суммы
             nonlocal current_price
-            current_price = base_price + sum(self.toppings[top]
-                                             for top in selected_toppings)
+            current_price += prices.toppings[topping] if selected else -prices.toppings[topping]
             price_label.configure(
                 text=f"Текущая стоимость: {current_price} руб.")
 
@@ -1118,7 +3860,7 @@ class PizzaMakerApp(ctk.CTk):
 
         topping_vars = {}
 
-        for topping, price in self.toppings.items():
+        for topping, price in prices.toppings.items():
             frame = ctk.CTkFrame(scroll_frame)
             frame.pack(pady=2, fill="x")
 
@@ -1128,13 +3870,14 @@ class PizzaMakerApp(ctk.CTk):
             def make_callback(t):
 
                 def callback():
-                    if var.get():
+                    if topping_vars[t].get():
                         if t not in selected_toppings:
                             selected_toppings.append(t)
+                            update_price(t, True)
                     else:
                         if t in selected_toppings:
                             selected_toppings.remove(t)
-                    update_price()
+                            update_price(t, False)
 
                 return callback
 
@@ -1150,13 +3893,9 @@ class PizzaMakerApp(ctk.CTk):
                                        "Выберите хотя бы одну начинку!")
                 return
 
-            description = f"Кастомная пицца с: {', '.join(selected_toppings)}"
-            self.current_order.append({
-                "item": description,
-                "price": current_price
-            })
-            self.total_amount += current_price
-            self.update_cart_display()
+            line, is_new = self.cart.add(
+                prices.custom_line(audience, selected_toppings))
+            self.refresh_cart_line(line, is_new)
             dialog.destroy()
             messagebox.showinfo("Успех",
                                 "Кастомная пицца добавлена в корзину!")
@@ -1167,47 +3906,57 @@ class PizzaMakerApp(ctk.CTk):
                       height=40).pack(pady=20)
 
     def checkout(self):
-        if not self.current_order:
+        if not len(self.cart):
             messagebox.showwarning("Предупреждение", "Корзина пуста!")
             return
 
         self.create_payment_frame()
 
     def create_payment_frame(self):
-        self.clear_frame()
+        self.show_screen("payment")
+
+        order_text = self.payment_order_text
+        order_text.configure(state="normal")
+        order_text.delete("1.0", "end")
+        for line in self.cart:
+            order_text.insert("end",
+                              f"• {line.display_name()} x{line.quantity} - {line.total} руб.\n")
+            if line.comment:
+                order_text.insert("end", f"   💬 {line.comment}\n")
+
+        # Показываем общий комментарий если есть
+        if self.user_comment:
+            order_text.insert("end", f"\n📝 Общий комментарий: {self.user_comment}\n")
+
+        order_text.configure(state="disabled")
+        self.payment_total_label.configure(text=f"Итого: {self.cart.total} руб.")
 
-        title_label = ctk.CTkLabel(self,
+        self.payment_var.set("card")
+        self.cash_entry.delete(0, "end")
+        self.cash_frame.pack_forget()
+
+    def build_payment_screen(self, screen):
+        title_label = ctk.CTkLabel(screen,
                                    text="Оформление заказа",
                                    font=ctk.CTkFont(size=24, weight="bold"))
         title_label.pack(pady=20)
 
-        order_frame = ctk.CTkFrame(self)
+        order_frame = ctk.CTkFrame(screen)
         order_frame.pack(pady=10, padx=50, fill="x")
 
         ctk.CTkLabel(order_frame,
                      text="Ваш заказ:",
                      font=ctk.CTkFont(size=16, weight="bold")).pack(pady=10)
 
-        order_text = ctk.CTkTextbox(order_frame, height=150)
-        order_text.pack(pady=10, padx=10, fill="x")
-
-        for item in self.current_order:
-            order_text.insert("end",
-                              f"• {item['item']} - {item['price']} руб.\n")
-            if 'comment' in item:
-                order_text.insert("end", f"   💬 {item['comment']}\n")
-
-        # Показываем общий комментарий если есть
-        if self.user_comment:
-            order_text.insert("end", f"\n📝 Общий комментарий: {self.user_comment}\n")
-
-        order_text.configure(state="disabled")
+        self.payment_order_text = ctk.CTkTextbox(order_frame, height=150)
+        self.payment_order_text.pack(pady=10, padx=10, fill="x")
 
-        ctk.CTkLabel(order_frame,
-                     text=f"Итого: {self.total_amount} руб.",
-                     font=ctk.CTkFont(size=18, weight="bold")).pack(pady=10)
+        self.payment_total_label = ctk.CTkLabel(order_frame,
+                                                text="",
+                                                font=ctk.CTkFont(size=18, weight="bold"))
+        self.payment_total_label.pack(pady=10)
 
-        payment_frame = ctk.CTkFrame(self)
+        payment_frame = ctk.CTkFrame(screen)
         payment_frame.pack(pady=20, padx=50, fill="x")
 
         ctk.CTkLabel(payment_frame,
@@ -1244,7 +3993,7 @@ class PizzaMakerApp(ctk.CTk):
         card_btn.configure(command=on_payment_change)
         cash_btn.configure(command=on_payment_change)
 
-        button_frame = ctk.CTkFrame(self)
+        button_frame = ctk.CTkFrame(screen)
         button_frame.pack(pady=20)
 
         ctk.CTkButton(button_frame,
@@ -1268,13 +4017,13 @@ class PizzaMakerApp(ctk.CTk):
         if payment_method == "cash":
             try:
                 cash_amount = int(self.cash_entry.get())
-                if cash_amount < self.total_amount:
+                if cash_amount < self.cart.total:
                     messagebox.showerror(
                         "Ошибка",
-                        f"Недостаточно средств! Нужно еще {self.total_amount - cash_amount} руб."
+                        f"Недостаточно средств! Нужно еще {self.cart.total - cash_amount} руб."
                     )
                     return
-                change = cash_amount - self.total_amount
+                change = cash_amount - self.cart.total
                 payment_text = "Наличные"
             except ValueError:
                 messagebox.showerror("Ошибка", "Введите корректную сумму!")
@@ -1282,252 +4031,93 @@ class PizzaMakerApp(ctk.CTk):
         else:
             payment_text = "Карта"
 
-        receipt_id = self.generate_receipt(payment_text, change)
-        self.show_receipt_frame(receipt_id, payment_text, change)
-
-    def generate_receipt(self, payment_method, change):
-        receipt_id = datetime.now().strftime("%Y%m%d%H%M%S")
-        order_items = []
-
-        # Собираем информацию о заказе с комментариями
-        for item in self.current_order:
-            item_info = item['item']
-            if 'comment' in item:
-                item_info += f" (комментарий: {item['comment']})"
-            order_items.append(item_info)
-
-        # Сохранение в Excel
-        order_data = {
-            'ID': receipt_id,
-            'Дата': datetime.now().strftime('%d.%m.%Y %H:%M:%S'),
-            'ФИО': self.user_data["fio"],
-            'Возраст': self.user_data["age"],
-            'Заказ': '; '.join(order_items),
-            'Комментарий': self.user_comment,
-            'Сумма': self.total_amount,
-            'Оплата': payment_method,
-            'Сдача': change
-        }
-
-        if self.data_manager.add_order(order_data):
-            print("Заказ сохранен в Excel")
-        else:
-            print("Ошибка сохранения заказа")
-
-        # Обновление остатков
-        order_item_names = [item['item'] for item in self.current_order]
-        self.data_manager.update_inventory(order_item_names)
-
-        # Генерация QR-кода
-        self.generate_qr_code(receipt_id)
-
-        return receipt_id
-
-    def generate_qr_code(self, receipt_id):
+        order = OrderSnapshot.from_cart(self.cart, self.user_data,
+                                        self.user_comment, payment_text, change)
+        self.show_receipt_frame(order)
+        self.generate_receipt(order)
+
+    def generate_receipt(self, order):
+        """Запуск фоновой обработки заказа: запись, остатки, QR и PDF"""
+        pipeline = self.receipt_pipeline
+        rid = order.receipt_id
+        pipeline.submit(self.save_order, order,
+                        on_done=lambda r, e: self.on_receipt_job_done(rid, "order", r, e))
+        pipeline.submit(self.update_stock, order,
+                        on_done=lambda r, e: self.on_receipt_job_done(rid, "stock", r, e))
+        pipeline.submit(self.render_receipt_files, order,
+                        on_done=lambda r, e: self.on_receipt_job_done(rid, "pdf", r, e))
+
+    def save_order(self, order):
+        if not self.data_manager.add_order(order.to_record()):
+            raise RuntimeError("Ошибка сохранения заказа")
+        print("Заказ сохранен")
+
+    def update_stock(self, order):
+        low_stock = self.data_manager.update_inventory(
+            self.recipes.deductions(order.lines))
+        if low_stock is None:
+            raise RuntimeError("Ошибка обновления остатков")
+        return low_stock
+
+    def render_receipt_files(self, order):
+        qr_matrix = self.generate_qr_code(order)
+        pdf_file = self.generate_pdf_receipt(order, qr_matrix)
+        if pdf_file is None:
+            raise RuntimeError("Ошибка при генерации PDF")
+        return pdf_file
+
+    def on_receipt_job_done(self, receipt_id, job, result, error):
+        """Результат фоновой задачи (вызывается в потоке Tk)"""
+        if job == "pdf" and error is None:
+            self.receipt_files[receipt_id] = result
+        if job == "stock" and result:
+            messagebox.showwarning(
+                "Внимание",
+                f"Низкий запас продуктов:\n{', '.join(result)}")
+
+        labels = getattr(self, "receipt_status_labels", {})
+        label = labels.get((receipt_id, job))
+        if label is not None and label.winfo_exists():
+            title = self.RECEIPT_JOB_TITLES[job]
+            if error is not None:
+                label.configure(text=f"❌ {title}: {error}", text_color="red")
+            elif job == "pdf":
+                label.configure(text=f"✅ {title}: {result}", text_color="green")
+            else:
+                label.configure(text=f"✅ {title}", text_color="green")
+        elif error is not None:
+            # Экран чека уже закрыт - сообщаем, не блокируя следующего клиента
+            print(f"Чек {receipt_id}: {error}")
+            notice = ctk.CTkToplevel(self)
+            notice.title("Ошибка обработки чека")
+            ctk.CTkLabel(notice, text=f"Чек №{receipt_id}:\n{error}",
+                         text_color="red").pack(padx=20, pady=20)
+
+    def generate_qr_code(self, order, save_to_file=SAVE_QR_FILES):
+        """Матрица модулей QR-кода чека (PNG на диск - только по запросу)"""
         try:
-            qr_link = self.receipt_config['QR']['Ссылка']
-            qr_data = f"Чек №: {receipt_id}\n"
-            qr_data += f"Сумма: {self.total_amount} руб.\n"
-            qr_data += f"Дата: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}\n"
-            qr_data += f"Сайт: {qr_link}"
-
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-            qr.add_data(qr_data)
-            qr.make(fit=True)
-
-            img = qr.make_image(fill_color="black", back_color="white")
-            if not os.path.exists('qrcodes'):
-                os.makedirs('qrcodes')
-            img.save(f"qrcodes/receipt_{receipt_id}.png")
-
+            template = ReceiptTemplate.for_config(self.receipt_config)
+            return template.qr_matrix(order, save_to_file)
         except Exception as e:
             print(f"Ошибка при генерации QR-кода: {e}")
+            return None
 
-    def generate_pdf_receipt(self, receipt_id, payment_method, change):
+    def generate_pdf_receipt(self, order, qr_matrix=None):
         """Генерация чека в формате PDF по ФЗ-54"""
         try:
-            pdf_filename = f"receipt_{receipt_id}.pdf"
-            if not os.path.exists('receipts'):
-                os.makedirs('receipts')
-            pdf_path = os.path.join('receipts', pdf_filename)
-
-            c = canvas.Canvas(pdf_path, pagesize=letter)
-            width, height = letter
-
-            company_name = self.receipt_config['Чек']['Название_компании']
-            inn = self.receipt_config['Чек']['ИНН']
-            address = self.receipt_config['Чек']['Адрес']
-            vat_rate = self.receipt_config['Чек']['НДС']
-
-            y_position = height - 80
-
-            # КАССОВЫЙ ЧЕК (ФЗ-54)
-            c.setFont("Helvetica-Bold", 14)
-            c.drawCentredString(width / 2, y_position, "КАССОВЫЙ ЧЕК")
-            y_position -= 30
-
-            # Организация
-            c.setFont("Helvetica-Bold", 11)
-            c.drawString(100, y_position, company_name)
-            y_position -= 18
-
-            c.setFont("Helvetica", 9)
-            c.drawString(100, y_position, f"ИНН: {inn}")
-            y_position -= 15
-            c.drawString(100, y_position, f"Адрес: {address}")
-            y_position -= 15
-            c.drawString(100, y_position, "СНО: УСН")
-            y_position -= 25
-
-            # Линия
-            c.line(80, y_position, width - 80, y_position)
-            y_position -= 20
-
-            # Дата и смена
-            c.setFont("Helvetica", 9)
-            receipt_date = datetime.now()
-            c.drawString(100, y_position, f"Дата: {receipt_date.strftime('%d.%m.%Y %H:%M:%S')}")
-            y_position -= 15
-            c.drawString(100, y_position, f"Кассир: {self.user_data.get('fio', 'Администратор')}")
-            y_position -= 15
-            c.drawString(100, y_position, f"Смена №: 1")
-            y_position -= 15
-            c.drawString(100, y_position, f"Чек №: {receipt_id}")
-            y_position -= 25
-
-            # Линия
-            c.line(80, y_position, width - 80, y_position)
-            y_position -= 20
-
-            # ТОВАРЫ
-            c.setFont("Helvetica-Bold", 10)
-            c.drawString(100, y_position, "ТОВАРЫ:")
-            y_position -= 18
-
-            c.setFont("Helvetica", 8)
-            vat_amount = 0
-            for item in self.current_order:
-                item_name = item['item']
-                quantity = item.get('quantity', 1)
-                price = item['price']
-                total = price * quantity
-                item_vat = int(total * 20 / 120)
-                vat_amount += item_vat
-
-                # Название товара
-                c.drawString(100, y_position, item_name)
-                y_position -= 12
-
-                # Комментарий к товару если есть
-                if 'comment' in item:
-                    c.drawString(110, y_position, f"Комментарий: {item['comment']}")
-                    y_position -= 12
-
-                # Количество x Цена = Сумма
-                c.drawString(110, y_position, f"{quantity} x {price}.00 = {total}.00")
-                y_position -= 12
-                # НДС 20%
-                c.drawString(110, y_position, f"НДС 20%: {item_vat}.00")
-                y_position -= 18
-
-            # Общий комментарий если есть
-            if self.user_comment:
-                y_position -= 10
-                c.setFont("Helvetica-Bold", 9)
-                c.drawString(100, y_position, "Общий комментарий клиента:")
-                y_position -= 12
-                c.setFont("Helvetica", 8)
-                # Разбиваем длинный комментарий на строки
-                comment_lines = []
-                words = self.user_comment.split()
-                current_line = ""
-                for word in words:
-                    if len(current_line + word) <= 50:
-                        current_line += word + " "
-                    else:
-                        comment_lines.append(current_line)
-                        current_line = word + " "
-                if current_line:
-                    comment_lines.append(current_line)
-
-                for line in comment_lines:
-                    c.drawString(100, y_position, line)
-                    y_position -= 12
-
-            # Линия
-            c.line(80, y_position, width - 80, y_position)
-            y_position -= 20
-
-            # ИТОГО
-            c.setFont("Helvetica-Bold", 11)
-            c.drawString(100, y_position, f"ИТОГО: {self.total_amount}.00 руб")
-            y_position -= 18
-
-            # НДС
-            c.setFont("Helvetica", 9)
-            c.drawString(100, y_position, f"в т.ч. НДС 20%: {vat_amount}.00 руб")
-            y_position -= 20
-
-            # Форма оплаты
-            c.setFont("Helvetica-Bold", 9)
-            if payment_method == "Наличные":
-                c.drawString(100, y_position, f"НАЛИЧНЫМИ: {self.total_amount}.00 руб")
-                y_position -= 15
-                if change > 0:
-                    c.drawString(100, y_position, f"Сдача: {change}.00 руб")
-                    y_position -= 15
-            else:
-                c.drawString(100, y_position, f"БЕЗНАЛИЧНЫМИ: {self.total_amount}.00 руб")
-                y_position -= 15
-
-            y_position -= 10
-            c.line(80, y_position, width - 80, y_position)
-            y_position -= 20
-
-            # Фискальная информация
-            c.setFont("Helvetica", 8)
-            c.drawString(100, y_position, f"РН ККТ: 0000{inn[:10]}")
-            y_position -= 12
-            c.drawString(100, y_position, f"ЗН ККТ: 00000000{inn[:6]}")
-            y_position -= 12
-            c.drawString(100, y_position, f"ФН: 9999{inn[:8]}")
-            y_position -= 12
-            c.drawString(100, y_position, f"ФД: {receipt_id}")
-            y_position -= 12
-            fiscal_sign = int(receipt_id[-8:]) if len(receipt_id) >= 8 else int(receipt_id)
-            c.drawString(100, y_position, f"ФП: {fiscal_sign}")
-            y_position -= 20
-
-            # QR-код
-            qr_image_path = f"qrcodes/receipt_{receipt_id}.png"
-            if os.path.exists(qr_image_path):
-                c.drawImage(qr_image_path, 180, 50, width=150, height=150)
-
-            c.save()
-            return pdf_path
+            template = ReceiptTemplate.for_config(self.receipt_config)
+            return template.render(order, template.pdf_path(order), qr_matrix)
 
         except Exception as e:
             print(f"Ошибка при генерации PDF: {e}")
             return None
 
-    def show_receipt_frame(self, receipt_id, payment_method, change):
-        self.clear_frame()
-
-        # Генерация PDF чека
-        pdf_file = self.generate_pdf_receipt(receipt_id, payment_method, change)
-
-        title_label = ctk.CTkLabel(self,
-                                   text="Заказ оформлен! 🎉",
-                                   font=ctk.CTkFont(size=24, weight="bold"))
-        title_label.pack(pady=20)
-
-        receipt_frame = ctk.CTkFrame(self)
-        receipt_frame.pack(pady=10, padx=50, fill="both", expand=True)
+    def show_receipt_frame(self, order):
+        self.show_screen("receipt")
+        receipt_id = order.receipt_id
+        payment_method = order.payment_method
+        change = order.change
+        self.current_receipt_id = receipt_id
 
         # Формирование чека с настройками
         company_name = self.receipt_config['Чек']['Название_компании']
@@ -1542,40 +4132,70 @@ class PizzaMakerApp(ctk.CTk):
 Телефон: {phone}
 
 ЧЕК №: {receipt_id}
-Дата: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}
-Клиент: {self.user_data['fio']}
-Возраст: {self.user_data['age']}
+Дата: {order.date_text}
+Клиент: {order.fio}
+Возраст: {order.age}
 
 ЗАКАЗ:
 """
-        for item in self.current_order:
-            receipt_text += f"• {item['item']} - {item['price']} руб.\n"
-            if 'comment' in item:
-                receipt_text += f"  💬 {item['comment']}\n"
+        for line in order.lines:
+            receipt_text += f"• {line.display_name()} x{line.quantity} - {line.total} руб.\n"
+            if line.comment:
+                receipt_text += f"  💬 {line.comment}\n"
 
         # Добавляем общий комментарий если есть
-        if self.user_comment:
-            receipt_text += f"\n📝 Общий комментарий: {self.user_comment}\n"
+        if order.comment:
+            receipt_text += f"\n📝 Общий комментарий: {order.comment}\n"
 
-        receipt_text += f"\nИТОГО: {self.total_amount} руб."
+        receipt_text += f"\nИТОГО: {order.total} руб."
         receipt_text += f"\nНДС: {vat}"
         receipt_text += f"\nОплата: {payment_method}"
 
         if payment_method == "Наличные":
-            receipt_text += f"\nВнесено: {self.total_amount + change} руб."
+            receipt_text += f"\nВнесено: {order.total + change} руб."
             receipt_text += f"\nСдача: {change} руб."
 
         receipt_text += f"\n\nСпасибо за заказ! 🍕"
-        receipt_text += f"\n\nPDF чек сохранен: {pdf_file}"
 
-        receipt_display = ctk.CTkTextbox(receipt_frame,
-                                         font=ctk.CTkFont(family="Courier", size=12))
-        receipt_display.pack(pady=20, padx=20, fill="both", expand=True)
+        receipt_display = self.receipt_display
+        receipt_display.configure(state="normal")
+        receipt_display.delete("1.0", "end")
         receipt_display.insert("1.0", receipt_text)
         receipt_display.configure(state="disabled")
 
+        # Ход фоновой обработки заказа
+        self.receipt_status_labels = {}
+        for job, title in self.RECEIPT_JOB_TITLES.items():
+            label = self.receipt_job_labels[job]
+            label.configure(text=f"⏳ {title}...", text_color=self.receipt_label_color)
+            self.receipt_status_labels[(receipt_id, job)] = label
+
+    def build_receipt_screen(self, screen):
+        self.current_receipt_id = None
+
+        title_label = ctk.CTkLabel(screen,
+                                   text="Заказ оформлен! 🎉",
+                                   font=ctk.CTkFont(size=24, weight="bold"))
+        title_label.pack(pady=20)
+
+        receipt_frame = ctk.CTkFrame(screen)
+        receipt_frame.pack(pady=10, padx=50, fill="both", expand=True)
+
+        self.receipt_display = ctk.CTkTextbox(receipt_frame,
+                                              font=ctk.CTkFont(family="Courier", size=12))
+        self.receipt_display.pack(pady=20, padx=20, fill="both", expand=True)
+
+        status_frame = ctk.CTkFrame(receipt_frame)
+        status_frame.pack(pady=(0, 10), padx=20, fill="x")
+        self.receipt_job_labels = {}
+        for job in self.RECEIPT_JOB_TITLES:
+            label = ctk.CTkLabel(status_frame, text="", anchor="w")
+            label.pack(anchor="w", padx=10)
+            self.receipt_job_labels[job] = label
+        self.receipt_label_color = label.cget("text_color")
+
         # Кнопки для чека
-        receipt_actions_frame = ctk.CTkFrame(self)
+        receipt_actions_frame = ctk.CTkFrame(screen)
         receipt_actions_frame.pack(pady=10)
 
         ctk.CTkLabel(receipt_actions_frame,
@@ -1587,7 +4207,8 @@ class PizzaMakerApp(ctk.CTk):
 
         ctk.CTkButton(receipt_btns_frame,
                       text="📧 Отправить",
-                      command=lambda: self.send_receipt(pdf_file),
+                      command=lambda: self.send_receipt(
+                          self.receipt_files.get(self.current_receipt_id)),
                       width=120,
                       height=35,
                       fg_color="blue",
@@ -1595,7 +4216,8 @@ class PizzaMakerApp(ctk.CTk):
 
         ctk.CTkButton(receipt_btns_frame,
                       text="💾 Скачать PDF",
-                      command=lambda: self.download_receipt(pdf_file),
+                      command=lambda: self.download_receipt(
+                          self.receipt_files.get(self.current_receipt_id)),
                       width=120,
                       height=35,
                       fg_color="purple",
@@ -1603,14 +4225,15 @@ class PizzaMakerApp(ctk.CTk):
 
         ctk.CTkButton(receipt_btns_frame,
                       text="🖨️ Печать",
-                      command=lambda: self.print_receipt(pdf_file),
+                      command=lambda: self.print_receipt(
+                          self.receipt_files.get(self.current_receipt_id)),
                       width=120,
                       height=35,
                       fg_color="orange",
                       hover_color="#cc5500").pack(side="left", padx=5)
 
         # Основные кнопки
-        button_frame = ctk.CTkFrame(self)
+        button_frame = ctk.CTkFrame(screen)
         button_frame.pack(pady=20)
 
         ctk.CTkButton(button_frame,
@@ -1623,7 +4246,7 @@ class PizzaMakerApp(ctk.CTk):
 
         ctk.CTkButton(button_frame,
                       text="Выход",
-                      command=self.quit,
+                      command=self.on_close,
                       width=150,
                       height=40,
                       fg_color="red",
@@ -1668,9 +4291,13 @@ class PizzaMakerApp(ctk.CTk):
 
     def restart_app(self):
         self.user_data = {}
-        self.current_order = []
-        self.total_amount = 0
+        self.cart.clear()
         self.user_comment = ""
+        # Экран чека скрыт: ошибки фоновых задач показываются отдельным окном
+        self.receipt_status_labels = {}
+        if "menu" in self.screens and self.search_var.get():
+            self.search_var.set("")  # следующий клиент видит меню без фильтра
+            self._menu_key = None
         self.load_configuration()
         self.create_welcome_frame()
 
@@ -1863,7 +4490,7 @@ class SettingsWindow(ctk.CTkToplevel):
                      text="Укажите процент скидки для каждого объема:",
                      font=ctk.CTkFont(size=12)).pack(anchor="w", pady=5)
 
-        volumes = ["0.33л", "0.5л", "1л", "1.5л", "2л"]
+        volumes = PriceTable.DRINK_VOLUMES
 
         for volume in volumes:
             frame = ctk.CTkFrame(scroll_frame)
@@ -1909,105 +4536,68 @@ class SettingsWindow(ctk.CTkToplevel):
                      text="Аналитические графики",
                      font=ctk.CTkFont(size=16, weight="bold")).pack(pady=10)
 
+        self.report_status = ctk.CTkLabel(graphs_frame, text="")
+        self.report_status.pack(pady=5)
+
         ctk.CTkButton(graphs_frame,
                       text="📊 Популярные заказы",
-                      command=self.show_popular_orders_chart,
+                      command=lambda: self.show_report_chart("popular"),
                       width=200).pack(pady=5)
 
         ctk.CTkButton(graphs_frame,
                       text="👥 Распределение по возрастам",
-                      command=self.show_age_distribution_chart,
+                      command=lambda: self.show_report_chart("ages"),
                       width=200).pack(pady=5)
 
         ctk.CTkButton(graphs_frame,
                       text="💰 Статистика продаж",
-                      command=self.show_sales_chart,
+                      command=lambda: self.show_report_chart("weekday"),
                       width=200).pack(pady=5)
 
-    def show_popular_orders_chart(self):
-        """График популярных заказов"""
-        popular_orders = self.parent.analytics_manager.get_popular_orders(10)
-
-        if not popular_orders:
-            messagebox.showinfo("Информация", "Нет данных для построения графика")
-            return
-
-        items, counts = zip(*popular_orders)
-
-        plt.figure(figsize=(12, 8))
-        bars = plt.barh(items, counts, color='skyblue')
-        plt.xlabel('Количество заказов')
-        plt.title('Топ-10 самых популярных заказов')
-        plt.gca().invert_yaxis()
-
-        # Добавляем значения на столбцы
-        for bar, count in zip(bars, counts):
-            plt.text(bar.get_width() + 0.1, bar.get_y() + bar.get_height() / 2,
-                     f'{count}', ha='left', va='center')
-
-        plt.tight_layout()
-        plt.show()
+        ctk.CTkButton(graphs_frame,
+                      text="🕒 Загрузка по часам",
+                      command=lambda: self.show_report_chart("hourly"),
+                      width=200).pack(pady=5)
 
-    def show_age_distribution_chart(self):
-        """График распределения по возрастам"""
-        age_distribution = self.parent.analytics_manager.get_age_distribution()
+        # Графики берутся из готового отчета; устаревший строится в фоне
+        self.refresh_report()
 
-        if age_distribution.empty:
-            messagebox.showinfo("Информация", "Нет данных для построения графика")
+    def refresh_report(self):
+        """Показ готового отчета или его построение в фоне"""
+        report = self.parent.analytics_report
+        self.report_charts = report.cached()
+        if self.report_charts is not None:
+            self.report_status.configure(text="✅ Отчет актуален", text_color="green")
             return
+        self.report_status.configure(text="⏳ Построение отчета...", text_color="gray")
+        self.parent.receipt_pipeline.submit(report.render, on_done=self.on_report_ready)
 
-        plt.figure(figsize=(12, 8))
-        age_distribution.plot(kind='bar', color='lightcoral')
-        plt.xlabel('Возраст')
-        plt.ylabel('Количество заказов')
-        plt.title('Распределение заказов по возрастам')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.show()
-
-    def show_sales_chart(self):
-        """График статистики продаж"""
-        df = self.parent.analytics_manager.load_orders_data()
+    def on_report_ready(self, charts, error):
+        """Отчет построен (вызывается в потоке Tk)"""
+        if not self.winfo_exists():
+            return
+        if error is not None:
+            self.report_status.configure(text=f"❌ Ошибка построения отчета: {error}",
+                                         text_color="red")
+            return
+        self.report_charts = charts
+        self.report_status.configure(text="✅ Отчет актуален", text_color="green")
 
-        if df.empty:
+    def show_report_chart(self, name):
+        """Окно с готовым графиком из отчета"""
+        if self.report_charts is None:
+            messagebox.showinfo("Информация", "Отчет еще строится, попробуйте через несколько секунд")
+            return
+        chart_file = self.report_charts.get(name)
+        if chart_file is None:
             messagebox.showinfo("Информация", "Нет данных для построения графика")
             return
 
-        # Анализ по дням недели
-        df['Дата'] = pd.to_datetime(df['Дата'])
-        df['День недели'] = df['Дата'].dt.day_name()
-
-        # Перевод на русский
-        days_translation = {
-            'Monday': 'Понедельник',
-            'Tuesday': 'Вторник',
-            'Wednesday': 'Среда',
-            'Thursday': 'Четверг',
-            'Friday': 'Пятница',
-            'Saturday': 'Суббота',
-            'Sunday': 'Воскресенье'
-        }
-        df['День недели'] = df['День недели'].map(days_translation)
-
-        daily_sales = df.groupby('День недели')['Сумма'].sum()
-        daily_orders = df.groupby('День недели')['Сумма'].count()
-
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
-
-        # График выручки по дням
-        daily_sales.plot(kind='bar', ax=ax1, color='gold')
-        ax1.set_title('Выручка по дням недели')
-        ax1.set_ylabel('Выручка (руб)')
-        ax1.tick_params(axis='x', rotation=45)
-
-        # График количества заказов по дням
-        daily_orders.plot(kind='bar', ax=ax2, color='lightgreen')
-        ax2.set_title('Количество заказов по дням недели')
-        ax2.set_ylabel('Количество заказов')
-        ax2.tick_params(axis='x', rotation=45)
-
-        plt.tight_layout()
-        plt.show()
+        image = Image.open(chart_file)
+        window = ctk.CTkToplevel(self)
+        window.title(AnalyticsReport.CHARTS[name])
+        chart = ctk.CTkImage(light_image=image, dark_image=image, size=image.size)
+        ctk.CTkLabel(window, image=chart, text="").pack(padx=10, pady=10)
 
     def load_current_settings(self):
         """Загрузка текущих настроек в поля"""
@@ -2023,74 +4613,87 @@ class SettingsWindow(ctk.CTkToplevel):
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка загрузки настроек: {e}")
 
-    def save_all_settings(self):
-        """Сохранение всех настроек"""
-        try:
-            # Сохранение настроек чека
-            receipt_data = {}
-            for key, entry in self.receipt_entries.items():
-                receipt_data[key] = entry.get()
-
-            qr_data = {'Ссылка': self.qr_entry.get()}
-
-            self.config_manager.save_receipt_config({
-                'receipt': receipt_data,
-                'qr': qr_data
-            })
-
-            # Сохранение меню взрослое
-            adult_menu = {"Пиццы": {}, "Напитки": {}}
-            for pizza, entries in self.menu_adult_entries["Пиццы"].items():
-                adult_menu["Пиццы"][pizza] = {
-                    "цена": int(entries["цена"].get()),
-                    "размер": entries["размер"].get(),
-                    "ингредиенты": entries["ингредиенты"].get()
-                }
-
-            for drink, entries in self.menu_adult_entries["Напитки"].items():
-                adult_menu["Напитки"][drink] = {
-                    "цена": int(entries["цена"].get()),
-                    "объем": entries["объем"].get()
-                }
+    def collect_settings(self):
+        """Чтение и проверка всех полей до записи.
 
-            self.config_manager.save_menu_config(adult_menu, 'menu_adult.txt')
+        Возвращает (путь -> текст файла, список ошибок); при ошибках
+        ни один файл не записывается.
+        """
+        errors = []
 
-            # Сохранение меню детское
-            minor_menu = {"Пиццы": {}, "Напитки": {}}
-            for pizza, entries in self.menu_minor_entries["Пиццы"].items():
-                minor_menu["Пиццы"][pizza] = {
-                    "цена": int(entries["цена"].get()),
-                    "размер": entries["размер"].get(),
-                    "ингредиенты": entries["ингредиенты"].get()
+        def number(entry, cast, where, low=0, high=None):
+            text = entry.get().strip()
+            try:
+                value = cast(text.replace(',', '.') if cast is float else text)
+            except ValueError:
+                value = None
+            if value is None or value < low or (high is not None and value > high):
+                limits = f"от {low} до {high}" if high is not None else f"не меньше {low}"
+                errors.append(f"{where}: '{text}' - нужно число {limits}")
+            return value
+
+        def text_field(entry, where, required=True):
+            text = entry.get().strip()
+            if required and not text:
+                errors.append(f"{where}: поле не заполнено")
+            elif '|' in text:
+                errors.append(f"{where}: символ '|' недопустим")
+            return text
+
+        def collect_menu(entries, title):
+            menu = {"Пиццы": {}, "Напитки": {}}
+            for pizza, fields in entries["Пиццы"].items():
+                where = f"{title}, {pizza}"
+                menu["Пиццы"][pizza] = {
+                    "цена": number(fields["цена"], int, f"{where}, цена"),
+                    "размер": text_field(fields["размер"], f"{where}, размер"),
+                    "ингредиенты": text_field(fields["ингредиенты"], f"{where}, ингредиенты",
+                                              required=False)
                 }
-
-            for drink, entries in self.menu_minor_entries["Напитки"].items():
-                minor_menu["Напитки"][drink] = {
-                    "цена": int(entries["цена"].get()),
-                    "объем": entries["объем"].get()
+            for drink, fields in entries["Напитки"].items():
+                where = f"{title}, {drink}"
+                menu["Напитки"][drink] = {
+                    "цена": number(fields["цена"], int, f"{where}, цена"),
+                    "объем": text_field(fields["объем"], f"{where}, объем")
                 }
+            return menu
 
-            self.config_manager.save_menu_config(minor_menu, 'menu_minor.txt')
-
-            # Сохранение начинок
-            toppings_data = {}
-            for topping, entry in self.topping_entries.items():
-                toppings_data[topping] = int(entry.get())
-
-            self.config_manager.save_toppings(toppings_data)
+        receipt_data = {key: entry.get().strip() for key, entry in self.receipt_entries.items()}
+        qr_data = {'Ссылка': self.qr_entry.get().strip()}
+        adult_menu = collect_menu(self.menu_adult_entries, "Взрослое меню")
+        minor_menu = collect_menu(self.menu_minor_entries, "Детское меню")
+        toppings_data = {
+            topping: number(entry, int, f"Начинка {topping}")
+            for topping, entry in self.topping_entries.items()
+        }
+        discounts_data = {"напитки": {
+            volume: number(entry, float, f"Скидка на {volume}", high=100)
+            for volume, entry in self.discount_entries.items()
+        }}
+        if errors:
+            return {}, errors
+
+        files = {
+            'config/receipt_config.txt': self.config_manager.render_receipt_config(
+                {'receipt': receipt_data, 'qr': qr_data}),
+            'config/menu_adult.txt': self.config_manager.render_menu_config(adult_menu),
+            'config/menu_minor.txt': self.config_manager.render_menu_config(minor_menu),
+            'config/toppings.txt': self.config_manager.render_toppings(toppings_data),
+            'config/discounts_config.txt': self.config_manager.render_discounts(discounts_data)
+        }
+        return files, errors
 
-            # Сохранение скидок
-            discounts_data = {"напитки": {}}
-            for volume, entry in self.discount_entries.items():
-                try:
-                    discount = float(entry.get())
-                    discounts_data["напитки"][volume] = discount
-                except ValueError:
-                    discounts_data["напитки"][volume] = 0.0
+    def save_all_settings(self):
+        """Сохранение всех настроек одной транзакцией"""
+        try:
+            files, errors = self.collect_settings()
+            if errors:
+                messagebox.showerror("Ошибка", "Настройки не сохранены:\n" + "\n".join(errors))
+                return
 
-            self.config_manager.save_discounts(discounts_data)
+            self.config_manager.commit(files)
 
-            # Перезагрузка конфигурации в основном приложении
+            # Новые конфиги уже в кэше - перечитывать файлы не нужно
             self.parent.load_configuration()
 
             messagebox.showinfo("Успех", "Настройки сохранены!")
@@ -2100,13 +4703,148 @@ class SettingsWindow(ctk.CTkToplevel):
             messagebox.showerror("Ошибка", f"Ошибка сохранения настроек: {e}")
 
 
+_rerender_config = None
+
+
+def _init_rerender_worker():
+    global _rerender_config
+    _rerender_config = ConfigManager().load_receipt_config()
+
+
+def _rerender_receipts(records, output_dir):
+    """Перепечатка пачки чеков в процессе-исполнителе.
+
+    Возвращает количество готовых чеков и список (ID, ошибка).
+    """
+    template = ReceiptTemplate.for_config(_rerender_config)
+    done, errors = 0, []
+    for record in records:
+        try:
+            order = OrderSnapshot.from_record(record)
+            template.render(order, template.pdf_path(order, output_dir),
+                            template.qr_matrix(order, save_to_file=False))
+            done += 1
+        except Exception as e:
+            errors.append((record.get('ID'), str(e)))
+    return done, errors
+
+
+def rerender_receipts(date_from=None, date_to=None, output_dir="receipts",
+                      workers=None, chunk_size=50):
+    """Повторная генерация PDF-чеков сохраненных заказов за период"""
+    start = datetime.strptime(date_from, '%d.%m.%Y') if date_from else None
+    end = (datetime.strptime(date_to, '%d.%m.%Y') + pd.Timedelta(days=1)
+           if date_to else None)
+    data_manager = DataManager()
+    df = data_manager.load_orders(start, end, columns=ORDER_COLUMNS)
+    data_manager.storage.close()
+    records = json.loads(df.to_json(orient='records', force_ascii=False))
+    total = len(records)
+    if not total:
+        print("Нет заказов за указанный период")
+        return 0
+
+    workers = workers or os.cpu_count() or 1
+    chunks = [records[i:i + chunk_size] for i in range(0, total, chunk_size)]
+    print(f"Чеков к генерации: {total}, процессов: {workers}")
+
+    done = 0
+    failed = []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_rerender_worker) as executor:
+        futures = [executor.submit(_rerender_receipts, chunk, output_dir)
+                   for chunk in chunks]
+        for future in as_completed(futures):
+            chunk_done, chunk_errors = future.result()
+            done += chunk_done
+            failed += chunk_errors
+            print(f"\r{done + len(failed)}/{total}", end="", flush=True)
+    elapsed = time.perf_counter() - started
+
+    print()
+    for receipt_id, error in failed:
+        print(f"Ошибка при генерации PDF {receipt_id}: {error}")
+    print(f"Готово: {done} чеков в {output_dir} за {elapsed:.1f} с "
+          f"({done / elapsed:.1f} чеков/с), ошибок: {len(failed)}")
+    return done
+
+
+def run_cli(args):
+    """Команды без графического интерфейса"""
+    if args.command == "migrate":
+        data_manager = DataManager(backend="sqlite")
+        print(f"Заказов в хранилище: {data_manager.storage.count_orders()}")
+        data_manager.storage.close()
+    elif args.command == "export":
+        data_manager = DataManager()
+        if data_manager.export_to_excel(force=True):
+            print(f"Выгружено: {data_manager.orders_file}, {data_manager.inventory_file}")
+        data_manager.storage.close()
+    elif args.command == "rebuild-analytics":
+        data_manager = DataManager()
+        print(f"Агрегаты пересчитаны, заказов: {data_manager.rebuild_analytics()}")
+        data_manager.storage.close()
+    elif args.command == "archive":
+        data_manager = DataManager()
+        if args.rebuild:
+            data_manager.archive.reset()
+        days = data_manager.archive_orders()
+        print(f"Дней добавлено в архив: {days} ({data_manager.archive.extension})")
+        data_manager.storage.close()
+    elif args.command == "report":
+        data_manager = DataManager()
+        data_manager.load_analytics()
+        report = AnalyticsReport(AnalyticsManager(data_manager), args.output)
+        report.render(force=args.force)
+        print(f"Отчет: {os.path.join(args.output, 'index.html')}")
+        data_manager.storage.close()
+    elif args.command == "rerender":
+        rerender_receipts(args.date_from, args.date_to, args.output, args.workers)
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pizza Maker 🍕")
+    parser.add_argument("--exit-after-first-frame", action="store_true",
+                        help="выйти сразу после отрисовки первого окна "
+                             "(для benchmarks/bench_startup.py)")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("migrate",
+                          help="перенести orders.xlsx/inventory.xlsx в SQLite")
+    subparsers.add_parser("export",
+                          help="выгрузить заказы и остатки в Excel")
+    subparsers.add_parser("rebuild-analytics",
+                          help="пересчитать агрегаты аналитики по всем заказам")
+    archive_parser = subparsers.add_parser(
+        "archive", help="перенести закрытые дни в колоночный архив заказов")
+    archive_parser.add_argument("--rebuild", action="store_true",
+                                help="собрать архив заново")
+    report_parser = subparsers.add_parser(
+        "report", help="построить отчет аналитики (PNG и HTML)")
+    report_parser.add_argument("--output", default="reports",
+                               help="папка отчета (по умолчанию reports)")
+    report_parser.add_argument("--force", action="store_true",
+                               help="перестроить, даже если данные не менялись")
+    rerender_parser = subparsers.add_parser(
+        "rerender", help="заново сгенерировать PDF-чеки сохраненных заказов")
+    rerender_parser.add_argument("--from", dest="date_from", metavar="ДД.ММ.ГГГГ",
+                                 help="первый день периода")
+    rerender_parser.add_argument("--to", dest="date_to", metavar="ДД.ММ.ГГГГ",
+                                 help="последний день периода (включительно)")
+    rerender_parser.add_argument("--output", default="receipts",
+                                 help="папка для чеков (по умолчанию receipts)")
+    rerender_parser.add_argument("--workers", type=int,
+                                 help="число процессов (по умолчанию - все ядра)")
+    args = parser.parse_args()
+
     # Проверка существования конфигурационных файлов
-    if not os.path.exists('config'):
+    if args.command:
+        run_cli(args)
+    elif not os.path.exists('config'):
         messagebox.showwarning(
             "Внимание",
             "Конфигурационные файлы не найдены!\nЗапустите setup.py для установки."
         )
     else:
-        app = PizzaMakerApp()
+        app = PizzaMakerApp(exit_after_first_frame=args.exit_after_first_frame)
         app.mainloop()
@@ -4,6 +4,44 @@ import sys
 import shutil
 
 
+# Рецептуры (config/recipes.txt в репозитории создается из этой же строки)
+RECIPES_CONFIG = """[Основа]
+пицца = Тесто:1, Томатный соус:0.1
+
+[Пиццы]
+маргарита = Сыр:0.2
+пепперони = Сыр:0.2, Пепперони:0.05
+гавайская = Сыр:0.2, Ветчина:0.05, Ананасы:0.05
+четыре сыра = Сыр:0.4
+мясная = Сыр:0.2, Пепперони:0.05, Ветчина:0.05, Бекон:0.05
+вегетарианская = Сыр:0.2, Перец:0.05, Грибы:0.05, Оливки:0.05, Лук:0.05
+кастомная = Сыр:0.2
+
+[Размеры]
+маленькая = 0.6
+средняя = 0.8
+большая = 1.0
+
+[Начинки]
+сыр = Сыр:0.05
+пепперони = Пепперони:0.05
+ветчина = Ветчина:0.05
+бекон = Бекон:0.05
+грибы = Грибы:0.05
+ананасы = Ананасы:0.05
+оливки = Оливки:0.05
+лук = Лук:0.05
+перец = Перец:0.05
+
+[Напитки]
+кола = Кола:1
+фанта = Фанта:1
+спрайт = Спрайт:1
+вода = Вода:1
+сок = Сок:1
+"""
+
+
 def install_requirements():
     """Установка необходимых библиотек"""
     requirements = [
@@ -66,6 +104,7 @@ def create_config_files():
 Вода=80|0.5л
 Сок=150|0.5л
 """,
+        'config/recipes.txt': RECIPES_CONFIG,
         'config/toppings.txt':
         """Сыр=50
 Пепперони=70
@@ -0,0 +1,35 @@
+"""Чтение агрегатов аналитики во время записи новых заказов"""
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main  # noqa: E402
+
+
+def test_readers_see_consistent_copies_while_orders_are_added(tmp_path):
+    aggregates = main.AnalyticsAggregates(str(tmp_path / "analytics.json"))
+    manager = main.AnalyticsManager(type("Data", (), {"analytics": aggregates})())
+    report = main.AnalyticsReport(manager, str(tmp_path / "reports"))
+    count = 300
+
+    def add_orders():
+        for i in range(count):
+            aggregates.add({'Сумма': 100, 'Возраст': 20 + i % 50,
+                            'Дата': f"01.06.2025 {i % 24:02d}:00:00",
+                            'Заказ': f"позиция {i}"})
+
+    writer = threading.Thread(target=add_orders)
+    writer.start()
+    while writer.is_alive():
+        manager.get_popular_orders(5)
+        manager.get_age_distribution()
+        manager.get_sales_statistics()
+        orders, revenue = map(int, report.generation().split('-'))
+        assert revenue == orders * 100
+    writer.join()
+
+    assert aggregates.totals() == (count, count * 100)
+    assert len(manager.get_popular_orders(count + 1)) == count
+    assert sum(orders for orders, _ in aggregates.hour_buckets()) == count
@@ -0,0 +1,19 @@
+"""Объединение одинаковых позиций в корзине"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main  # noqa: E402
+
+
+def test_custom_pizza_toppings_order_does_not_matter():
+    cart = main.Cart()
+    cart.add(main.CartLine("custom", "кастомная", toppings=("Сыр", "Лук"), unit_price=475))
+    line, is_new = cart.add(
+        main.CartLine("custom", "кастомная", toppings=("Лук", "Сыр"), unit_price=475))
+
+    assert not is_new
+    assert len(cart) == 1
+    assert line.quantity == 2
+    assert cart.total == 950
@@ -0,0 +1,49 @@
+"""Транзакционное сохранение конфигов"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main  # noqa: E402
+
+
+@pytest.fixture
+def config_manager(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manager = main.ConfigManager()
+    manager.commit({
+        'config/menu_adult.txt': "[Пиццы]\nмаргарита = 450|большая|сыр\n\n[Напитки]\nкола = 150|1л\n",
+        'config/toppings.txt': "Сыр=50\n",
+    })
+    return manager
+
+
+def test_commit_caches_parsed_configs(config_manager):
+    misses = config_manager.cache_misses
+    menu = config_manager.load_menu_config('menu_adult.txt')
+    assert menu["Пиццы"]["маргарита"]["цена"] == 450
+    assert config_manager.load_toppings() == {"Сыр": 50}
+    assert config_manager.cache_misses == misses
+
+
+@pytest.mark.parametrize("path, text", [
+    ('config/menu_adult.txt', "[Пиццы]\nмаргарита = дорого|большая|сыр\n"),
+    ('config/discounts_config.txt', "[Скидки_напитки]\n0.5л = пять\n"),
+    ('config/receipt_config.txt', ""),
+    ('config/toppings.txt', "Сыр=много\n"),
+])
+def test_parse_error_aborts_whole_commit(config_manager, path, text):
+    generation = config_manager.generation
+    before = {name: open(f'config/{name}', encoding='utf-8').read()
+              for name in ('menu_adult.txt', 'toppings.txt')}
+
+    with pytest.raises(Exception):
+        config_manager.commit({'config/toppings.txt': "Сыр=70\n", path: text})
+
+    assert config_manager.generation == generation
+    for name, content in before.items():
+        assert open(f'config/{name}', encoding='utf-8').read() == content
+    assert config_manager.load_toppings() == {"Сыр": 50}
+    assert not [name for name in os.listdir('config') if name.endswith('.tmp')]
@@ -0,0 +1,45 @@
+"""Восстановление остатков из журнала после неудачных сохранений"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main  # noqa: E402
+
+
+class FailingStorage:
+    def __init__(self):
+        self.fail = True
+        self.saved = None
+
+    def save_inventory(self, df):
+        if self.fail:
+            raise OSError("диск недоступен")
+        self.saved = df
+
+
+RECORDS = [{'Продукт': product, 'Количество': 10, 'Единица_измерения': 'кг',
+            'Минимальный_запас': 0} for product in ('A', 'B')]
+
+
+def test_failed_flushes_keep_all_decrements(tmp_path):
+    wal_file = str(tmp_path / "inventory.wal")
+    storage = FailingStorage()
+    cache = main.InventoryCache(storage, wal_file)
+    cache.load(RECORDS, recover=False)
+
+    cache.decrement([('A', 1)])
+    assert not cache.flush()
+    cache.decrement([('B', 2)])
+    assert not cache.flush()
+    cache.decrement([('B', 3)])
+    cache.close()
+
+    # Сбой: остатки в хранилище не обновлены, восстановление из журналов
+    restored = main.InventoryCache(storage, wal_file)
+    storage.fail = False
+    restored.load(RECORDS)
+    assert restored.items['A'][0] == 9
+    assert restored.items['B'][0] == 5
+    assert storage.saved['Количество'].tolist() == [9, 5]
+    assert not os.path.exists(wal_file + '.old')
@@ -0,0 +1,75 @@
+"""Переиспользование строк виртуализированного списка меню (без дисплея)"""
+
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main  # noqa: E402
+
+
+class FakeRow:
+    def __init__(self):
+        self.bound = None
+        self.packed = False
+        self.binds = 0
+
+    def bind(self, name, info, audience):
+        self.binds += 1
+        self.name = name
+
+    def winfo_manager(self):
+        return "pack" if self.packed else ""
+
+    def pack(self, **kwargs):
+        self.packed = True
+
+    def pack_forget(self):
+        self.packed = False
+
+
+def make_view(rows):
+    view = types.SimpleNamespace(
+        items=[], audience=None, generation=None, offset=0, visible=rows,
+        rows=[FakeRow() for _ in range(rows)],
+        app=types.SimpleNamespace(config_manager=types.SimpleNamespace(generation=1)),
+        scrollbar=types.SimpleNamespace(set=lambda first, last: None),
+        page_label=types.SimpleNamespace(configure=lambda text: None))
+    for name in ("render", "scroll", "scroll_to", "set_items"):
+        setattr(view, name, getattr(main.MenuListView, name).__get__(view))
+    return view
+
+
+def test_filtering_does_not_rebind_rows_showing_same_items():
+    view = make_view(3)
+    items = [(f"пицца {i}", {}) for i in range(10)]
+    view.set_items(items, "adult")
+    assert [row.binds for row in view.rows] == [1, 1, 1]
+
+    # Каждое нажатие в поле поиска снова передает тот же результат
+    view.set_items(items, "adult")
+    view.set_items(list(items), "adult")
+    assert [row.binds for row in view.rows] == [1, 1, 1]
+
+    # Первые две строки остались на местах - перепривязывается только третья
+    view.set_items(items[:2] + items[5:], "adult")
+    assert [row.binds for row in view.rows] == [1, 1, 2]
+    assert [row.name for row in view.rows] == ["пицца 0", "пицца 1", "пицца 5"]
+
+    view.set_items(items[:1], "adult")
+    assert [row.packed for row in view.rows] == [True, False, False]
+
+
+def test_settings_save_rebinds_rows_with_same_items():
+    view = make_view(3)
+    items = [(f"пицца {i}", {}) for i in range(10)]
+    view.set_items(items, "adult")
+
+    # Сохранение настроек (скидки, добавки) - позиции те же, цены другие
+    view.app.config_manager.generation = 2
+    view.set_items(items, "adult")
+    assert [row.binds for row in view.rows] == [2, 2, 2]
+    assert [row.bound for row in view.rows] == [(f"пицца {i}", "adult", 2) for i in range(3)]
+
+    view.set_items(items, "adult")
+    assert [row.binds for row in view.rows] == [2, 2, 2]
@@ -0,0 +1,57 @@
+"""Чтение архива заказов: партиции .npz (без pyarrow) и Feather"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main  # noqa: E402
+
+
+def make_orders(day):
+    return main.pd.DataFrame({
+        'ID': ['1', '2'],
+        'Дата': [day.strftime('%d.%m.%Y 10:00:00'), day.strftime('%d.%m.%Y 18:30:00')],
+        'Заказ': ['маргарита (большая)', 'кола (1л)'],
+        'Сумма': [450, 150],
+    })
+
+
+def test_lazy_numpy_keeps_load():
+    assert main.np.load is main.importlib.import_module("numpy").load
+
+
+def test_npz_partition_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "HAS_PYARROW", False)
+    archive = main.OrderArchive(str(tmp_path))
+    day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=2)
+    orders = make_orders(day)
+
+    assert archive.archive(lambda start: orders) == 1
+    assert os.path.exists(tmp_path / f"orders_{day:%Y-%m-%d}.npz")
+
+    loaded = archive.load(day, day + timedelta(days=1))
+    assert loaded['ID'].tolist() == ['1', '2']
+    assert loaded['Сумма'].tolist() == [450, 150]
+
+    columns = archive.load(day, day + timedelta(days=1), columns=['Заказ'])
+    assert columns.columns.tolist() == ['Заказ']
+    assert columns['Заказ'].tolist() == orders['Заказ'].tolist()
+
+
+def test_feather_partitions_with_different_column_types(tmp_path):
+    pytest.importorskip("pyarrow")
+    archive = main.OrderArchive(str(tmp_path))
+    first = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=3)
+    second = first + timedelta(days=1)
+    # В первый день возраст указан у всех (int64), во второй есть пропуск (double)
+    archive._write_partition(f"{first:%Y-%m-%d}", make_orders(first).assign(Возраст=[25, 40]))
+    archive._write_partition(f"{second:%Y-%m-%d}",
+                             make_orders(second).assign(Возраст=[30.0, None]))
+
+    loaded = archive.load(first, second + timedelta(days=1))
+    assert loaded['ID'].tolist() == ['1', '2', '1', '2']
+    assert loaded['Возраст'].tolist()[:3] == [25, 40, 30]
+    assert main.pd.isna(loaded['Возраст'].iloc[3])
@@ -0,0 +1,40 @@
+"""Таблица цен"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main  # noqa: E402
+
+DISCOUNTS = {
+    "напитки": {"0.5л": 5.0},
+    "пиццы_взрослые": {"средняя": 0.8, "большая": 1.0},
+    "пиццы_детские": {"средняя": 1.0},
+}
+
+
+def menu(custom_price):
+    return {
+        "Пиццы": {
+            "маргарита": {"цена": 500, "размер": "Большая", "ингредиенты": "сыр"},
+            "кастомная": {"цена": custom_price, "размер": "Большая", "ингредиенты": ""},
+        },
+        "Напитки": {"кола": {"цена": 100, "объем": "1л"}},
+    }
+
+
+def test_custom_pizza_base_comes_from_menu():
+    prices = main.PriceTable([menu(420), menu(310)], DISCOUNTS, {"Сыр": 50, "Лук": 25})
+
+    assert prices.custom_price("adult", ()) == 420
+    line = prices.custom_line("minor", ["Сыр", "Лук"])
+    assert line.unit_price == 310 + 75
+    assert line.toppings == ("Лук", "Сыр")
+
+
+def test_prices_include_size_and_volume_discounts():
+    prices = main.PriceTable([menu(400), menu(300)], DISCOUNTS, {})
+
+    assert prices.price("adult", "pizza", "маргарита", "средняя") == (400, 0.0)
+    assert prices.default_sizes[("adult", "маргарита")] == "большая"
+    assert prices.price("adult", "drink", "кола", "0.5л") == (95, 5.0)